@@ -0,0 +1,214 @@
+"""Offline sweep benchmark.
+
+Replays the pages in fixtures/ from a local stand-in for OLX and runs full
+sweeps through the real pipeline (fetch, parse, dedup, outbox, delivery to
+no-op channels) against a throwaway database.
+
+    python benchmark.py                                 # default matrix
+    python benchmark.py --searches 10 1000 10000 --seed-offers 0 1000000
+    python benchmark.py --latency 200 --error-rate 0.05 --output bench.jsonl
+
+Each scenario runs in its own process so peak memory is per scenario.
+Results are printed as JSON lines, one per scenario."""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE = "listing_state.html"
+
+def make_server(html, latency_ms, error_rate):
+    # Every search URL /q-<n>/ gets the fixture with its ad ids rewritten,
+    # so each search has its own offers instead of sharing one page.
+    async def listing(request):
+        if latency_ms:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * latency_ms / 1000)
+        if random.random() < error_rate:
+            return web.Response(status=503, text="injected error")
+        n = request.match_info["n"]
+        return web.Response(text=html.replace("-ID", f"-ID{n}x"), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/q-{n}/", listing)
+    return app
+
+def seed_db(path, searches, offers, port):
+    # Plain sqlite3 for speed; schema comes from database.init_db beforehand
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO searches (user_id, channel_id, url, city, query, category, filters) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((i, i, f"http://127.0.0.1:{port}/q-{i}/", "krakow", "bench", "praca", "{}") for i in range(searches))
+    )
+    conn.executemany(
+        "INSERT INTO offers (id, search_id, title, price, url) VALUES (?, ?, ?, ?, ?)",
+        ((f"https://www.olx.pl/oferta/seed-{i}.html", 0, "seed", "N/A", "") for i in range(offers))
+    )
+    conn.commit()
+    conn.close()
+
+class NullChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.messages = 0
+
+    async def send(self, content, embeds=None):
+        self.messages += 1
+
+def _rss_mb(kib):
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(kib / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def workers_peak_rss_mb(executor):
+    # Summed peak RSS of the parse worker processes. They are children of
+    # the forkserver, not of this process, so on Linux each one's high-water
+    # mark is read from /proc; elsewhere RUSAGE_CHILDREN covers the children
+    # that have been waited for.
+    processes = getattr(executor, "_processes", None) or {}
+    total = 0
+    for pid in processes:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+        except (OSError, StopIteration, ValueError):
+            return _rss_mb(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(total / 1024, 1) if processes else _rss_mb(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+async def run_scenario(args):
+    # The scenario's database (up to millions of seeded offers) and seen
+    # index live in a temporary directory that goes away with it
+    workdir = tempfile.mkdtemp(prefix="jobfinder-bench-")
+    try:
+        return await _run_scenario(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def _run_scenario(args, workdir):
+    import bot
+    import database
+    import pipeline
+    import scraper
+    from benchmark_parser import bench
+
+    database.DB_NAME = os.path.join(workdir, "bench.db")
+
+    with open(os.path.join(FIXTURES_DIR, FIXTURE), encoding="utf-8") as f:
+        html = f.read()
+
+    runner = web.AppRunner(make_server(html, args.latency, args.error_rate))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    await database.init_db()
+    await database.close_db()
+    seed_start = time.perf_counter()
+    seed_db(database.DB_NAME, args.searches, args.seed_offers, port)
+    seed_seconds = time.perf_counter() - seed_start
+
+    channels = {i: NullChannel(i) for i in range(args.searches)}
+    fetcher = scraper.Fetcher(concurrency=args.concurrency, host_interval=args.host_interval)
+    await fetcher.start()
+    pipe = pipeline.Pipeline(fetcher, channels.get, bot.client.build_embed, seen_path=os.path.join(workdir, "seen_index.bin"))
+    await pipe.start()
+
+    result = {
+        "searches": args.searches,
+        "seed_offers": args.seed_offers,
+        "latency_ms": args.latency,
+        "error_rate": args.error_rate,
+        "concurrency": args.concurrency,
+        "seed_seconds": round(seed_seconds, 3),
+        "sweeps": [],
+    }
+
+    for sweep in range(args.sweeps):
+        database.stats.clear()
+        start = time.perf_counter()
+        groups = {}
+        for search in await database.get_searches():
+            url = scraper.canonical_url(search['url'])
+            groups.setdefault(url, []).append((search, channels[search['channel_id']]))
+        jobs = [await pipe.submit(url, subs, json.loads(subs[0][0]['offer_cursor'] or "[]")) for url, subs in groups.items()]
+        new_offers = sum(await asyncio.gather(*(job.done for job in jobs)))
+        await pipe.dispatcher.join()
+        wall = time.perf_counter() - start
+
+        parsed = sum(job.parsed for job in jobs)
+        db_calls = sum(entry["calls"] for entry in database.stats.values())
+        result["sweeps"].append({
+            "sweep": sweep + 1,
+            "wall_seconds": round(wall, 3),
+            "offers_parsed": parsed,
+            "new_offers": new_offers,
+            "failed_jobs": sum(job.failed for job in jobs),
+            "db_calls": db_calls,
+            "db_ops_per_offer": round(db_calls / parsed, 4) if parsed else None,
+            "db_ms": {name: round(entry["total"] * 1000, 2) for name, entry in database.stats.items()},
+        })
+
+    parse_seconds, _ = bench(html, None, 5)
+    result["parse_ms_per_page"] = round(parse_seconds * 1000, 3)
+    result["peak_rss_mb"] = _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    result["peak_workers_rss_mb"] = workers_peak_rss_mb(fetcher.executor)
+
+    await pipe.close()
+    await fetcher.close()
+    await database.close_db()
+    await runner.cleanup()
+    return result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline sweep benchmark")
+    parser.add_argument("--searches", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--seed-offers", type=int, nargs="+", default=[0, 100000])
+    parser.add_argument("--latency", type=float, default=50, help="mean response latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--host-interval", type=float, default=0.0)
+    parser.add_argument("--sweeps", type=int, default=2, help="sweep 2+ measures the steady state")
+    parser.add_argument("--output", help="append JSON lines to this file as well")
+    parser.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.one:
+        args.searches = args.searches[0]
+        args.seed_offers = args.seed_offers[0]
+        print(json.dumps(asyncio.run(run_scenario(args))))
+        return
+
+    for searches in args.searches:
+        for seed_offers in args.seed_offers:
+            cmd = [
+                sys.executable, os.path.abspath(__file__), "--one",
+                "--searches", str(searches), "--seed-offers", str(seed_offers),
+                "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+                "--concurrency", str(args.concurrency), "--host-interval", str(args.host_interval),
+                "--sweeps", str(args.sweeps),
+            ]
+            # Scenario output is the last line; pipeline logging goes to stderr
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                continue
+            line = proc.stdout.strip().splitlines()[-1]
+            print(line)
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import glob
+import os
+import sys
+import time
+
+import scraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BACKENDS = ["bs4", "lxml", "auto"]
+
+def bench(html, backend, rounds):
+    # Best of `rounds` to filter out scheduler noise
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        offers, _ = scraper.parse_offers_until(html, backend=backend)
+        best = min(best, time.perf_counter() - start)
+    return best, len(offers)
+
+def run(rounds=20):
+    backends = [b for b in BACKENDS if b != "lxml" or scraper.lxml_html() is not None]
+    print(f"{'fixture':<24}{'backend':<8}{'offers':>8}{'ms/page':>10}{'speedup':>9}")
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        baseline = None
+        for backend in backends:
+            seconds, count = bench(html, backend, rounds)
+            baseline = baseline or seconds
+            print(f"{os.path.basename(path):<24}{backend:<8}{count:>8}{seconds * 1000:>10.2f}{baseline / seconds:>8.1f}x")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
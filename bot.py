@@ -3,63 +3,55 @@ from discord import app_commands
 from discord.ext import tasks
 import os
 from dotenv import load_dotenv
+
+# Before the local imports: they read settings from the environment
+load_dotenv()
+
 import scraper
 import database
+import scheduler
+import pipeline
+import metrics
+import catalog
+import normalize
+import rules
 import asyncio
 import json
+from datetime import datetime, time, timezone
 
-load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
 
 MY_GUILD = discord.Object(id=0) 
 
-FILTERS_CONFIG = {
-    "agreement": {
-        "label": "Typ umowy",
-        "options": [
-            ("Umowa o pracę", "part"),
-            ("Umowa zlecenie", "zlecenie"),
-            ("Umowa o dzieło", "contract"),
-            ("Praktyka / Staż", "practice"),
-        ]
-    },
-    "type": {
-        "label": "Wymiar pracy",
-        "options": [
-            ("Pełny etat", "fulltime"),
-            ("Część etatu", "parttime"),
-            ("Praca dodatkowa", "halftime"),
-        ]
-    },
-    "availability":{
-        "label": "Dostępność",
-        "options": [
-            ("Praca zmianowa", "shift_work"),
-            ("Praca w weekendy", "weekends_work"),
-            ("Elastyczny czas pracy", "flexible_work"),
-        ]
-    },
-    "experience":{
-        "label": "Doświadczenie",
-        "options": [
-            ("Wymagane doświadczenie", "exp_yes"),
-            ("Bez doświadczenia", "exp_no"),
-        ]
-    },
-}
+# Deepest backfill /findjob accepts (pages of ~40 offers)
+MAX_BACKFILL_PAGES = 500
+# /sweep: newest offers shown per category
+SWEEP_SHOWN = 5
+# /nearby: newest offers shown
+NEARBY_SHOWN = 10
+
+# Filter selects per wizard page (rows 0-3; the buttons take row 4)
+FILTERS_PER_PAGE = 4
+
+# Off-peak time for database maintenance (~4-5 AM in Poland)
+MAINTENANCE_TIME = time(hour=3, tzinfo=timezone.utc)
 
 class FilterSelect(discord.ui.Select):
-    def __init__(self, key, config):
-        options = [discord.SelectOption(label=l, value=v) for l, v in config["options"]]
+    def __init__(self, key, config, selected=(), row=None):
+        # Discord allows 25 options of up to 100 characters per select.
+        # Values chosen earlier stay ticked when the wizard pages back.
+        options = [discord.SelectOption(label=l[:100], value=v[:100], default=v[:100] in selected)
+                   for l, v in config["options"][:25]]
         # Remove "Any" to simplify multi-select logic (deselecting all = any)
         # Or keep it but handle exclusively? 
         # For multi-select, usually you just select what you want.
         
         super().__init__(
-            placeholder=config["label"], 
+            placeholder=config["label"][:150], 
             min_values=0, 
             max_values=len(options), 
-            options=options
+            options=options,
+            row=row
         )
         self.key = key
 
@@ -73,20 +65,36 @@ class FilterSelect(discord.ui.Select):
         await interaction.response.edit_message(embed=self.view.build_embed())
 
 class SetupWizard(discord.ui.View):
-    def __init__(self, city, query, user_id):
+    def __init__(self, city, query, user_id, search_rules=None, category="praca", backfill_pages=0):
         super().__init__()
         self.city = city
         self.query = query
+        self.category = category
+        self.backfill_pages = backfill_pages
         self.user_id = user_id
         self.filters = {}
+        self.rules = search_rules or {}
         self.setup_finished = False
 
-        # Add selects
-        for key, config in FILTERS_CONFIG.items():
-            self.add_item(FilterSelect(key, config))
+        # The most useful filters come first (catalog.FILTER_PRIORITY); the
+        # rest are a click on "More filters" away
+        self.ranked_filters = catalog.get().ranked_filters(category)
+        self.filter_page = 0
+        self.filter_pages = max(1, -(-len(self.ranked_filters) // FILTERS_PER_PAGE))
+        if self.filter_pages == 1:
+            self.remove_item(self.more_filters)
+        self.show_filters()
+
+    def show_filters(self):
+        for item in [item for item in self.children if isinstance(item, FilterSelect)]:
+            self.remove_item(item)
+        start = self.filter_page * FILTERS_PER_PAGE
+        for row, (key, config) in enumerate(self.ranked_filters[start:start + FILTERS_PER_PAGE]):
+            self.add_item(FilterSelect(key, config, self.filters.get(key, ()), row))
+        self.more_filters.label = f"More filters ({self.filter_page + 1}/{self.filter_pages}) ▶"
 
     def build_embed(self):
-        desc = f"City: **{self.city}**\nQuery: **{self.query}**\n\n**Current Filters:**\n"
+        desc = f"Category: **{self.category}**\nCity: **{self.city}**\nQuery: **{self.query}**\n\n**Current Filters:**\n"
         if not self.filters:
             desc += "None (All jobs)"
         else:
@@ -95,17 +103,35 @@ class SetupWizard(discord.ui.View):
                 if isinstance(v, list):
                    val_str = ", ".join(v)
                 desc += f"- {k}: {val_str}\n"
+        if self.rules:
+            desc += f"\n**Rules:** {rules.describe(self.rules)}\n"
         
-        url = scraper.build_olx_url(self.city, self.query, filters=self.filters)
+        url = self.search_url()
         desc += f"\n\n[Preview Link]({url})"
         return discord.Embed(title="Job Search Setup", description=desc, color=0x3498db)
 
+    def search_url(self):
+        # A radius search keeps the city and asks OLX for the area around it
+        # (search[dist]); the exact radius is checked locally by the rules.
+        # OLX's distances end at 100 km, so a wider search reads the whole
+        # country, where each check only sees the newest MAX_PAGES pages.
+        radius = self.rules.get("radius_km")
+        distance = scraper.olx_distance(radius) if radius else None
+        city = "" if radius and distance is None else self.city
+        return scraper.build_olx_url(city, self.query, self.category, filters=self.filters, distance=distance)
+
+    @discord.ui.button(label="More filters ▶", style=discord.ButtonStyle.grey, row=4)
+    async def more_filters(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.filter_page = (self.filter_page + 1) % self.filter_pages
+        self.show_filters()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
     @discord.ui.button(label="Finish & Save", style=discord.ButtonStyle.green, row=4)
     async def finish(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.setup_finished = True
         self.stop()
         
-        url = scraper.build_olx_url(self.city, self.query, filters=self.filters)
+        url = self.search_url()
         
          # Check/Create Channel
         user_searches = await database.get_user_searches(self.user_id)
@@ -126,63 +152,190 @@ class SetupWizard(discord.ui.View):
             channel = await guild.create_text_channel(f"jobs-{interaction.user.name}", overwrites=overwrites)
             channel_id = channel.id
 
-        await database.add_search(self.user_id, channel_id, url, self.city, self.query, "praca", json.dumps(self.filters))
+        await database.add_search(self.user_id, channel_id, url, self.city, self.query, self.category, json.dumps(self.filters),
+                                  json.dumps(self.rules) if self.rules else None, self.backfill_pages)
         await interaction.response.send_message(f"Search saved! Check <#{channel_id}>.", ephemeral=True)
 
+class HistoryView(discord.ui.View):
+    """Pages through /history results, one keyset page per click."""
+    def __init__(self, search, sort, text):
+        super().__init__(timeout=600)
+        self.search = search
+        self.sort = sort
+        self.text = text
+        self.cursor = None
+        self.page = 0
+
+    async def load_page(self):
+        rows, self.cursor = await database.get_offer_history(self.search['id'], self.sort, self.text, self.cursor)
+        self.page += 1
+        self.next_page.disabled = self.cursor is None
+        return self.build_embed(rows)
+
+    def build_embed(self, rows):
+        title = f"History: {self.search['query']} in {self.search['city']}"
+        if self.text:
+            title += f" ({self.text})"
+        lines = []
+        for row in rows:
+            offer = dict(row)
+            place = offer['city'] or offer['location'] or ""
+            lines.append(f"[{offer['title']}]({offer['url']}) · {normalize.format_salary(offer)} · {place} · {offer['created_at'][:10]}")
+        desc = "\n".join(lines) if lines else "No offers found."
+        embed = discord.Embed(title=title[:256], description=desc[:4096], color=0x3498db)
+        embed.set_footer(text=f"Page {self.page} · sorted by {self.sort}")
+        return embed
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.grey)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.edit_message(embed=await self.load_page(), view=self)
+
 from discord.ext import commands
 
 class MyBot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix="!", intents=discord.Intents.all())
+        self.fetcher = scraper.Fetcher()
+        self.scheduler = scheduler.Scheduler()
+        self.pipeline = pipeline.Pipeline(self.fetcher, self.get_channel, self.build_embed, self.on_checked)
+        self.metrics_runner = None
+        self.catalog_task = None
 
     async def setup_hook(self):
         await database.init_db()
+        await self.fetcher.start()
+        await self.pipeline.start()
+        self.metrics_runner = await metrics.start_server()
+        # Filter catalog: served from the cache file, rebuilt in the background when stale.
+        # The loop only keeps a weak reference to tasks, so this one is held here.
+        self.catalog_task = asyncio.create_task(self.refresh_catalog())
         self.bg_task.start()
+        self.maintenance_task.start()
+
+    async def close(self):
+        if self.catalog_task:
+            self.catalog_task.cancel()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        await self.pipeline.close()
+        await self.fetcher.close()
+        await database.close_db()
+        await super().close()
         
+    def build_embed(self, search, offer):
+        embed = discord.Embed(title=offer['title'], url=offer['url'], color=0x00ff00)
+        embed.add_field(name="💰 Price", value=normalize.format_salary(offer), inline=True)
+        if offer.get('location'):
+            embed.add_field(name="📍 Location", value=offer['location'], inline=True)
+        if offer.get('contract') and offer['contract'] != 'N/A':
+             embed.add_field(name="📝 Contract", value=offer['contract'], inline=True)
+        if offer.get('work_load') and offer['work_load'] != 'N/A':
+             embed.add_field(name="⏰ Work Load", value=offer['work_load'], inline=True)
+
+        embed.set_footer(text=f"Search: {search['query']}")
+        return embed
+
+    async def load_groups(self):
+        # Group searches by canonical URL so each distinct page is
+        # fetched and parsed once per check, however many users saved it.
+        searches = await database.get_searches()
+        groups = {}
+        for search in searches:
+            channel = self.get_channel(search['channel_id'])
+            if not channel: continue
+            url = scraper.canonical_url(search['url'])
+            groups.setdefault(url, []).append((search, channel))
+        return groups
+
+    def schedule_state(self, subscribers):
+        # (interval, last_checked) for a URL: the shortest stored interval
+        # and the most recent check among its subscribers. A URL none of
+        # them has checked yet (no cursor) is due immediately.
+        intervals = [search['poll_interval'] for search, _ in subscribers if search['poll_interval']]
+        checked = [search['last_checked'] for search, _ in subscribers if search['offer_cursor'] and search['last_checked']]
+        last_checked = None
+        if checked:
+            last = datetime.strptime(max(checked), "%Y-%m-%d %H:%M:%S")
+            last_checked = last.replace(tzinfo=timezone.utc).timestamp()
+        return (min(intervals) if intervals else None), last_checked
+
+    def on_checked(self, url, new_count, failed=False):
+        # Called by the pipeline when a URL is done; returns the new interval
+        if url in self.scheduler:
+            return self.scheduler.reschedule(url, new_count, failed=failed)
+        return None
+
+    async def check_groups(self, groups):
+        # Feeds URLs into the pipeline and returns their jobs; fetching,
+        # dedup and delivery happen in the pipeline's own workers.
+        jobs = []
+        for url, subscribers in groups.items():
+            # The cursor of a URL is the union of its subscribers' cursors
+            cursor = []
+            for search, _ in subscribers:
+                if search['offer_cursor']:
+                    cursor.extend(json.loads(search['offer_cursor']))
+            # Only used while the URL has no cursor, i.e. on its first check
+            backfill = max(search['backfill_pages'] or 0 for search, _ in subscribers)
+            jobs.append(await self.pipeline.submit(url, subscribers, list(dict.fromkeys(cursor)), backfill))
+        return jobs
+
     async def check_jobs(self):
+        # Checks every search now, regardless of schedule (used by !check)
         print("Checking jobs...")
         try:
-            searches = await database.get_searches()
-            for search in searches:
-                channel = self.get_channel(search['channel_id'])
-                if not channel: continue
-                
-                offers = scraper.fetch_offers(search['url'])
-                
-                count = 0
-                for offer in offers:
-                    if not await database.offer_exists(offer['id']):
-                        await database.add_offer(offer['id'], search['id'], offer['title'], offer['price'], offer['url'])
-                        
-                        embed = discord.Embed(title=offer['title'], url=offer['url'], color=0x00ff00)
-                        embed.add_field(name="💰 Price", value=offer['price'], inline=True)
-                        if offer.get('location'):
-                            embed.add_field(name="📍 Location", value=offer['location'], inline=True)
-                        if offer.get('contract') and offer['contract'] != 'N/A':
-                             embed.add_field(name="📝 Contract", value=offer['contract'], inline=True)
-                        if offer.get('work_load') and offer['work_load'] != 'N/A':
-                             embed.add_field(name="⏰ Work Load", value=offer['work_load'], inline=True)
-
-                        embed.set_footer(text=f"Search: {search['query']}")
-                        await channel.send(f"<@{search['user_id']}> New Offer!", embed=embed)
-                        count += 1
-                        await asyncio.sleep(1) 
-                
-                if count > 0:
-                    print(f"Sent {count} offers for search {search['id']}")
-                    
-                await asyncio.sleep(2) # Delay between searches
+            jobs = await self.check_groups(await self.load_groups())
+            await asyncio.gather(*(job.done for job in jobs))
         except Exception as e:
             print(f"Error in check logic: {e}")
 
-    @tasks.loop(minutes=10)
+    @tasks.loop(seconds=scheduler.TICK_SECONDS)
     async def bg_task(self):
-        await self.wait_until_ready()
-        await self.check_jobs()
+        # Each tick submits only the searches that are due. Intervals adapt
+        # per search, so work is spread over time instead of one burst.
+        # Submitted URLs are rescheduled by on_checked once processed.
+        due = []
+        submitted = set()
+        try:
+            groups = await self.load_groups()
+            self.scheduler.sync({url: self.schedule_state(subscribers) for url, subscribers in groups.items()})
+            for url in list(metrics.searches):
+                if url not in groups:
+                    metrics.forget(url)
+            due = self.scheduler.pop_due()
+            if due:
+                print(f"Checking {len(due)} of {len(groups)} searches...")
+                for job in await self.check_groups({url: groups[url] for url in due}):
+                    submitted.add(job.url)
+        except Exception as e:
+            print(f"Error in check logic: {e}")
+        finally:
+            # A due URL that never reached the pipeline must not drop out of the queue
+            for url in due:
+                if url not in submitted and url in self.scheduler:
+                    self.scheduler.reschedule(url, 0, failed=True)
+
+    async def refresh_catalog(self):
+        try:
+            await catalog.refresh()
+        except Exception as e:
+            print(f"Error refreshing filter catalog: {e}")
+
+    @tasks.loop(time=MAINTENANCE_TIME)
+    async def maintenance_task(self):
+        try:
+            result = await database.run_maintenance()
+            print(f"Maintenance: expired {result['expired']} offers, pruned {result['outbox_pruned']} outbox rows")
+        except Exception as e:
+            print(f"Error in maintenance: {e}")
+        await self.refresh_catalog()
 
     @bg_task.before_loop
     async def before_bg_task(self):
         await self.wait_until_ready()
+        # Runs in the pipeline's outbox worker, so a large backlog doesn't
+        # hold back the first sweep
+        self.pipeline.request_resume()
 
 client = MyBot()
 
@@ -194,6 +347,17 @@ async def check(ctx):
     await ctx.send("✅ Check complete.")
 
 
+@client.command()
+@commands.has_permissions(administrator=True)
+async def stats(ctx):
+    """Shows check loop timings and per-search counters (admins only)."""
+    text = metrics.summary()
+    text += f"\n\nScheduled: {len(client.scheduler)} | Pending sends: {client.pipeline.dispatcher.pending()}"
+    if not client.pipeline.shards:
+        # Scraper processes have their own breakers; see the blocked counter
+        text += f" | Circuit breaker: {client.fetcher.breaker.state}"
+    await ctx.send(text[:2000])
+
 @client.event
 async def on_ready():
     print(f'Logged in as {client.user} (ID: {client.user.id})')
@@ -208,11 +372,35 @@ async def sync(ctx):
     await ctx.send("Slash commands synced to this server! You might need to restart your Discord client (Ctrl+R) if they don't appear immediately.")
 
 @client.tree.command(name="findjob", description="Start monitoring OLX for jobs")
-@app_commands.describe(city="City name", query="Job title/keyword")
-async def findjob(interaction: discord.Interaction, city: str, query: str):
-    view = SetupWizard(city, query, interaction.user.id)
+@app_commands.describe(
+    city="City name", query="Job title/keyword",
+    keywords="Only offers with one of these words in the title (comma-separated)",
+    exclude="Skip offers with any of these words in the title (comma-separated)",
+    min_salary="Skip offers paying less than this (PLN)",
+    max_salary="Skip offers paying more than this (PLN)",
+    contract="Only these contract types, e.g. 'umowa o pracę, b2b'",
+    radius_km="Also include offers within this distance of the city (over 100 km searches all of Poland)",
+    category="OLX category (default: praca)",
+    backfill_pages=f"Also notify about older offers from this many result pages on the first check (max {MAX_BACKFILL_PAGES})"
+)
+async def findjob(interaction: discord.Interaction, city: str, query: str, keywords: str = None, exclude: str = None,
+                  min_salary: int = None, max_salary: int = None, contract: str = None, radius_km: int = None,
+                  category: str = "praca", backfill_pages: app_commands.Range[int, 0, MAX_BACKFILL_PAGES] = 0):
+    if category not in catalog.get().categories:
+        await interaction.response.send_message(f"Unknown category: {category}", ephemeral=True)
+        return
+    place = normalize.resolve_location(city)
+    if radius_km and not (place and place[2] is not None):
+        await interaction.response.send_message(f"Unknown city for a radius search: {city}", ephemeral=True)
+        return
+    search_rules = rules.from_options(keywords, exclude, min_salary, max_salary, contract, city, radius_km)
+    view = SetupWizard(city, query, interaction.user.id, search_rules, category, backfill_pages)
     await interaction.response.send_message(embed=view.build_embed(), view=view, ephemeral=True)
 
+@findjob.autocomplete("category")
+async def findjob_category(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=c, value=c) for c in catalog.get().categories if current.lower() in c][:25]
+
 @client.tree.command(name="listjobs", description="List your active searches")
 async def listjobs(interaction: discord.Interaction):
     searches = await database.get_user_searches(interaction.user.id)
@@ -227,42 +415,80 @@ async def listjobs(interaction: discord.Interaction):
         if s['filters']:
             try:
                 f_dict = json.loads(s['filters'])
-                readable_filters = []
-                
-                for key, val_or_list in f_dict.items():
-                    # Find config for this key
-                    config = FILTERS_CONFIG.get(key)
-                    if not config:
-                        readable_filters.append(f"{key}: {val_or_list}")
-                        continue
-                    
-                    # Helper to find label for a value
-                    def get_label(v):
-                        for label, value in config['options']:
-                            if value == v:
-                                return label
-                        return v # fallback
-                    
-                    # Handle list or single value
-                    if isinstance(val_or_list, list):
-                        labels = [get_label(v) for v in val_or_list]
-                        readable_value = ", ".join(labels)
-                    else:
-                        readable_value = get_label(val_or_list)
-                        
-                    readable_filters.append(f"**{config['label']}**: {readable_value}")
-                
-                filters_str = " | ".join(readable_filters)
+                filters_str = catalog.get().describe(s['category'] or "praca", f_dict) or "No filters"
             except json.JSONDecodeError:
                 filters_str = "Error parsing filters"
         else:
             filters_str = "No filters"
 
-        msg += f"🆔 **{s['id']}** | 🔍 `{s['query']}` in `{s['city']}`\n"
+        category = f" [{s['category']}]" if s['category'] and s['category'] != "praca" else ""
+        msg += f"🆔 **{s['id']}** | 🔍 `{s['query']}` in `{s['city']}`{category}\n"
         msg += f"   filters: {filters_str}\n" 
+        search_rules = rules.load(s['rules'])
+        if search_rules:
+            msg += f"   rules: {rules.describe(search_rules)}\n"
     
     await interaction.response.send_message(msg, ephemeral=True)
 
+@client.tree.command(name="history", description="Browse offers found by one of your searches")
+@app_commands.describe(search_id="Search ID from /listjobs", sort="Newest first or best paid first", text="Only offers with these words in the title")
+@app_commands.choices(sort=[app_commands.Choice(name="date", value="date"), app_commands.Choice(name="salary", value="salary")])
+async def history(interaction: discord.Interaction, search_id: int, sort: str = "date", text: str = None):
+    searches = await database.get_user_searches(interaction.user.id)
+    search = next((s for s in searches if s['id'] == search_id), None)
+    if not search:
+        await interaction.response.send_message(f"No search {search_id} among yours.", ephemeral=True)
+        return
+    # Acknowledge first so a slow query can't run into the 3-second deadline
+    await interaction.response.defer(ephemeral=True)
+    view = HistoryView(search, sort, text)
+    await interaction.followup.send(embed=await view.load_page(), view=view, ephemeral=True)
+
+@client.tree.command(name="nearby", description="Show the newest offers your searches found near a city")
+@app_commands.describe(city="City name", radius_km="Distance from the city center")
+async def nearby(interaction: discord.Interaction, city: str, radius_km: app_commands.Range[int, 1, 300] = 20):
+    place = normalize.resolve_location(city)
+    if not (place and place[2] is not None):
+        await interaction.response.send_message(f"Unknown city: {city}", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    name, _, lat, lon = place
+    rows = await database.get_offers_near(lat, lon, radius_km, interaction.user.id, NEARBY_SHOWN)
+    lines = []
+    for row in rows:
+        offer = dict(row)
+        distance = normalize.distance_km(lat, lon, offer['lat'], offer['lon'])
+        lines.append(f"[{offer['title']}]({offer['url']}) · {normalize.format_salary(offer)} · {offer['city'] or offer['location']} ({distance:.0f} km)")
+    desc = "\n".join(lines) if lines else "No offers found."
+    embed = discord.Embed(title=f"Offers within {radius_km} km of {name}"[:256], description=desc[:4096], color=0x3498db)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@client.tree.command(name="sweep", description="Show the newest offers for a query across several OLX categories")
+@app_commands.describe(city="City name", query="Keyword", pages=f"Result pages read per category (max {scraper.MAX_PAGES})")
+async def sweep(interaction: discord.Interaction, city: str, query: str, pages: app_commands.Range[int, 1, scraper.MAX_PAGES] = 1):
+    await interaction.response.defer(ephemeral=True)
+    urls = dict(zip(scraper.category_urls(city, query), scraper.SWEEP_CATEGORIES))
+    found = {category: [] for category in urls.values()}
+    # Categories are read at once; the sweep stops as soon as each has enough
+    stream = client.fetcher.sweep(urls, max_pages=pages)
+    try:
+        async for url, offer in stream:
+            shown = found[urls[url]]
+            if len(shown) < SWEEP_SHOWN:
+                shown.append(offer)
+            if all(len(offers) >= SWEEP_SHOWN for offers in found.values()):
+                break
+    except Exception as e:
+        await interaction.followup.send(f"Sweep failed: {e}", ephemeral=True)
+        return
+    finally:
+        await stream.aclose()
+    embed = discord.Embed(title=f"Sweep: {query} in {city}"[:256], color=0x3498db)
+    for category, offers in found.items():
+        lines = [f"[{offer['title']}]({offer['url']}) · {offer.get('price') or 'N/A'}" for offer in offers]
+        embed.add_field(name=category, value="\n".join(lines)[:1024] if lines else "No offers found.", inline=False)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
 @client.tree.command(name="stopjob", description="Stop a search by ID")
 async def stopjob(interaction: discord.Interaction, search_id: int):
     await database.remove_search(search_id, interaction.user.id)
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import time
+
+# Filter catalog: for each OLX category, the enum filters that can go into
+# a search URL (search[filter_enum_<key>][i]=<value>) with their labels.
+# Built by discover_filters.py and cached on disk; loaded on first use.
+CATALOG_PATH = "filters_catalog.json"
+CATALOG_VERSION = 1  # bump when the file layout changes; older files are rebuilt
+CATALOG_TTL = float(os.getenv("CATALOG_TTL_DAYS", "7")) * 86400
+CATEGORIES = [c.strip() for c in os.getenv("CATALOG_CATEGORIES", "praca,nieruchomosci,motoryzacja").split(",") if c.strip()]
+
+# Used until a catalog has been built, and for categories it lacks.
+# The values were collected by hand; a built catalog takes OLX's own.
+DEFAULT_FILTERS = {
+    "praca": {
+        "agreement": {
+            "label": "Typ umowy",
+            "options": [
+                ("Umowa o pracę", "part"),
+                ("Umowa zlecenie", "zlecenie"),
+                ("Umowa o dzieło", "contract"),
+                ("Praktyka / Staż", "practice"),
+            ]
+        },
+        "type": {
+            "label": "Wymiar pracy",
+            "options": [
+                ("Pełny etat", "fulltime"),
+                ("Część etatu", "parttime"),
+                ("Praca dodatkowa", "halftime"),
+            ]
+        },
+        "availability": {
+            "label": "Dostępność",
+            "options": [
+                ("Praca zmianowa", "shift_work"),
+                ("Praca w weekendy", "weekends_work"),
+                ("Elastyczny czas pracy", "flexible_work"),
+            ]
+        },
+        "experience": {
+            "label": "Doświadczenie",
+            "options": [
+                ("Wymagane doświadczenie", "exp_yes"),
+                ("Bez doświadczenia", "exp_no"),
+            ]
+        },
+    },
+}
+
+# Filters the /findjob wizard shows first, in this order. Keys a category's
+# catalog doesn't have are skipped; its other filters follow in catalog order.
+FILTER_PRIORITY = {
+    "praca": ("agreement", "type", "availability", "experience"),
+    "nieruchomosci": ("rooms", "market", "builttype", "furniture"),
+    "motoryzacja": ("petrol", "car_body", "transmission", "condition"),
+}
+
+class Catalog:
+    """Filters per category, with value -> label lookups precomputed."""
+    def __init__(self, categories, built_at=0.0):
+        self.categories = categories  # category -> key -> {"label", "options": [(label, value)]}
+        self.built_at = built_at
+        self.labels = {
+            category: {key: (config["label"], {value: label for label, value in config["options"]})
+                       for key, config in filters.items()}
+            for category, filters in categories.items()
+        }
+
+    def filters(self, category):
+        return self.categories.get(category, {})
+
+    def ranked_filters(self, category):
+        # [(key, config)] with the FILTER_PRIORITY ones first
+        filters = self.filters(category)
+        first = [key for key in FILTER_PRIORITY.get(category, ()) if key in filters]
+        rest = [key for key in filters if key not in first]
+        return [(key, filters[key]) for key in first + rest]
+
+    def stale(self, ttl=CATALOG_TTL):
+        return time.time() - self.built_at > ttl
+
+    def describe(self, category, filters):
+        # {"agreement": ["zlecenie"]} -> "**Typ umowy**: Umowa zlecenie"
+        readable = []
+        labels = self.labels.get(category, {})
+        for key, values in filters.items():
+            if key not in labels:
+                readable.append(f"{key}: {values}")
+                continue
+            label, names = labels[key]
+            if not isinstance(values, list):
+                values = [values]
+            readable.append(f"**{label}**: " + ", ".join(names.get(v, v) for v in values))
+        return " | ".join(readable)
+
+_catalog = None
+
+def load(path=CATALOG_PATH):
+    # Catalog from the cache file merged over the defaults. A missing,
+    # unreadable or old-version file gives just the defaults (built_at 0,
+    # so it counts as stale).
+    categories = {category: dict(filters) for category, filters in DEFAULT_FILTERS.items()}
+    built_at = 0.0
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == CATALOG_VERSION:
+            for category, filters in data["categories"].items():
+                categories[category] = {
+                    key: {"label": config["label"], "options": [tuple(option) for option in config["options"]]}
+                    for key, config in filters.items()
+                }
+            built_at = data["built_at"]
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring filter catalog {path}: {e}")
+    return Catalog(categories, built_at)
+
+def save(data, path=CATALOG_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def get():
+    global _catalog
+    if _catalog is None:
+        _catalog = load()
+    return _catalog
+
+async def refresh(force=False):
+    # Rebuilds the cache in a thread when it is older than CATALOG_TTL.
+    # The bot keeps using the current catalog until the new one is saved.
+    global _catalog
+    if not force and not get().stale():
+        return
+    import discover_filters
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(None, discover_filters.build_catalog, CATEGORIES)
+    if not data["categories"]:
+        print("Filter catalog not refreshed: nothing discovered")
+        return
+    save(data)
+    _catalog = load()
+    print(f"Filter catalog refreshed: {', '.join(data['categories'])}")
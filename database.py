@@ -1,81 +1,718 @@
 import aiosqlite
+import asyncio
+import functools
+import hashlib
 import os
+import time
+from contextlib import asynccontextmanager
+
+import normalize
 
 DB_NAME = "jobfinder.db"
 
-async def init_db():
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS searches (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                channel_id INTEGER,
-                url TEXT,
-                city TEXT,
-                query TEXT,
-                category TEXT,
-                filters TEXT,
-                last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        # Migration for existing DB matching the new schema if needed
+# Connection pool settings. Connections are opened once in init_db and
+# reused by every query until close_db is called on shutdown.
+POOL_SIZE = 4
+CACHED_STATEMENTS = 256  # per-connection prepared statement cache (sqlite3 default is 128)
+BUSY_TIMEOUT = 5.0       # seconds a writer waits for the lock before failing
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",  # 256 MB
+    "PRAGMA cache_size=-16000",    # ~16 MB of page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",      # off by default in SQLite; needed for ON DELETE CASCADE
+)
+HISTORY_PAGE_SIZE = 10  # offers per /history page
+SQLITE_MAX_VARS = 900  # stay under SQLITE_MAX_VARIABLE_NUMBER on old builds
+
+# Maintenance (see run_maintenance)
+OFFER_RETENTION_DAYS = int(os.getenv("OFFER_RETENTION_DAYS", "90"))
+OUTBOX_RETENTION_DAYS = 7     # delivered/failed outbox rows
+MAINTENANCE_BATCH = 5000      # offers expired per transaction
+VACUUM_PAGES = 2000           # pages released per incremental vacuum run
+PAGE_CACHE_RETENTION_DAYS = 7 # page_cache rows not refreshed for this long
+
+class ConnectionPool:
+    """A fixed set of long-lived aiosqlite connections handed out one at a time."""
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.idle = asyncio.Queue()
+        self.connections = []
+
+    async def open(self):
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(self.path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS)
+            conn.row_factory = aiosqlite.Row
+            for pragma in PRAGMAS:
+                await conn.execute(pragma)
+            self.connections.append(conn)
+            self.idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = await self.idle.get()
+        try:
+            yield conn
+        finally:
+            # A failed write must not go back with its transaction open:
+            # it would hold the WAL write lock and every other writer would
+            # time out with "database is locked"
+            if conn.in_transaction:
+                await conn.rollback()
+            self.idle.put_nowait(conn)
+
+    async def close(self):
+        for conn in self.connections:
+            await conn.close()
+        self.connections = []
+        self.idle = asyncio.Queue()
+
+_pool = None
+
+async def get_pool():
+    # Opened by init_db during setup_hook; lazily here for scripts.
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(DB_NAME)
+        await _pool.open()
+    return _pool
+
+async def close_db():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+@asynccontextmanager
+async def connection():
+    pool = await get_pool()
+    async with pool.acquire() as db:
+        yield db
+
+@asynccontextmanager
+async def transaction():
+    # Connection for a multi-statement write: commits at the end, rolls
+    # everything back if any statement fails
+    async with connection() as db:
         try:
-            await db.execute("ALTER TABLE searches ADD COLUMN filters TEXT")
-        except:
-            pass
+            yield db
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
 
+# Latency counters per database function: name -> {"calls", "total", "max"} (seconds)
+stats = {}
+
+def timed(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = stats.setdefault(func.__name__, {"calls": 0, "total": 0.0, "max": 0.0})
+            entry["calls"] += 1
+            entry["total"] += elapsed
+            entry["max"] = max(entry["max"], elapsed)
+    return wrapper
+
+# Schema migrations, applied in order by init_db. PRAGMA user_version holds
+# the number of migrations already applied, so on an up-to-date database
+# startup costs a single read. Append new steps; never edit applied ones.
+async def _add_column(db, table, column):
+    # Databases from before versioning may or may not have the column yet
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {row[1] for row in await cursor.fetchall()}
+    if column.split()[0] not in existing:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+async def _migrate_base_schema(db):
+    # 1: everything up to versioning. Also brings unversioned databases,
+    # created by any earlier release, up to date.
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            channel_id INTEGER,
+            url TEXT,
+            city TEXT,
+            query TEXT,
+            category TEXT,
+            filters TEXT,
+            last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await _add_column(db, "searches", "filters TEXT")
+    # Newest offer ids seen for this search (JSON list), used to stop scraping early
+    await _add_column(db, "searches", "offer_cursor TEXT")
+    # Adaptive polling interval in seconds (see scheduler.py)
+    await _add_column(db, "searches", "poll_interval REAL")
+    # Extra conditions checked on parsed offers (JSON, see rules.py)
+    await _add_column(db, "searches", "rules TEXT")
+    # Pages to read on the first check of a new search (0 = first page only)
+    await _add_column(db, "searches", "backfill_pages INTEGER DEFAULT 0")
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS offers (
+            id TEXT PRIMARY KEY,
+            search_id INTEGER,
+            title TEXT,
+            price TEXT,
+            url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(search_id) REFERENCES searches(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Notifications waiting for delivery. Written in the same transaction
+    # that marks an offer as seen, so an offer is never lost between
+    # "seen" and "sent". state: pending -> sent | failed
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            offer_id TEXT,
+            search_id INTEGER,
+            channel_id INTEGER,
+            user_id INTEGER,
+            payload TEXT,
+            state TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_state ON outbox(state)")
+
+    # Retention scans by age; ON DELETE CASCADE looks offers up by search
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_created_at ON offers(created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_search_id ON offers(search_id)")
+
+    # Normalized salary and place (see normalize.py). salary_monthly is the
+    # upper end converted to a monthly amount, for sorting and filtering.
+    for column in ("salary_min REAL", "salary_max REAL", "salary_period TEXT", "salary_monthly REAL",
+                   "city TEXT", "district TEXT", "lat REAL", "lon REAL"):
+        await _add_column(db, "offers", column)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_salary ON offers(salary_monthly)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_city ON offers(city)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_geo ON offers(lat, lon)")
+
+    # Offers delivered to each search, for /history. offer_rowid doubles
+    # as the date order (rowids grow with inserts) and salary_monthly is
+    # copied from offers so both sort orders are served by an index.
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_offers'") as cursor:
+        new_history = await cursor.fetchone() is None
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS search_offers (
+            search_id INTEGER,
+            offer_rowid INTEGER,
+            salary_monthly REAL,
+            PRIMARY KEY (search_id, offer_rowid)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_search_offers_salary ON search_offers(search_id, salary_monthly, offer_rowid)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_search_offers_offer ON search_offers(offer_rowid)")
+    if new_history:
+        # Until now only the owning search was known
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS offers (
-                id TEXT PRIMARY KEY,
-                search_id INTEGER,
-                title TEXT,
-                price TEXT,
-                url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(search_id) REFERENCES searches(id) ON DELETE CASCADE
-            )
+            INSERT OR IGNORE INTO search_offers (search_id, offer_rowid, salary_monthly)
+            SELECT search_id, rowid, salary_monthly FROM offers WHERE search_id IS NOT NULL
         """)
-        await db.commit()
 
-async def add_search(user_id, channel_id, url, city, query, category, filters_json):
-    async with aiosqlite.connect(DB_NAME) as db:
+    # Full-text index over offer titles. External content (no second
+    # copy of the titles), kept in step with offers by the triggers below.
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE name = 'offers_fts'") as cursor:
+        new_fts = await cursor.fetchone() is None
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS offers_fts USING fts5(
+            title, content='offers', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    if new_fts:
+        await db.execute("INSERT INTO offers_fts(offers_fts) VALUES ('rebuild')")
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS offers_after_insert AFTER INSERT ON offers BEGIN
+            INSERT INTO offers_fts (rowid, title) VALUES (new.rowid, new.title);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS offers_after_delete AFTER DELETE ON offers BEGIN
+            INSERT INTO offers_fts (offers_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+            DELETE FROM search_offers WHERE offer_rowid = old.rowid;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS searches_after_delete AFTER DELETE ON searches BEGIN
+            DELETE FROM search_offers WHERE search_id = old.id;
+        END
+    """)
+
+    # Expired offers leave only a 64-bit hash of their id behind, so they
+    # are still recognised as seen if they show up again.
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS offer_fingerprints (
+            fingerprint INTEGER PRIMARY KEY
+        )
+    """)
+
+async def _migrate_page_cache(db):
+    # 2: validators and listing hash of each search's first page, so the
+    # first check after a restart is a conditional request (see scraper.Fetcher)
+    await db.execute("""
+        CREATE TABLE page_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            hash TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+async def _migrate_offers_set_null(db):
+    # 3: offers outlive the search that first recorded them. They are the
+    # dedup state of every search on the same URL, so with ON DELETE CASCADE
+    # /stopjob on the owner made the other subscribers see them as new again.
+    # SQLite can't alter a foreign key, so the table is rebuilt; rowids are
+    # copied as they are, since offers_fts and search_offers refer to them.
+    await db.execute("""
+        CREATE TABLE offers_new (
+            id TEXT PRIMARY KEY,
+            search_id INTEGER,
+            title TEXT,
+            price TEXT,
+            url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            salary_min REAL,
+            salary_max REAL,
+            salary_period TEXT,
+            salary_monthly REAL,
+            city TEXT,
+            district TEXT,
+            lat REAL,
+            lon REAL,
+            FOREIGN KEY(search_id) REFERENCES searches(id) ON DELETE SET NULL
+        )
+    """)
+    columns = "id, search_id, title, price, url, created_at, salary_min, salary_max, salary_period, salary_monthly, city, district, lat, lon"
+    await db.execute(f"INSERT INTO offers_new (rowid, {columns}) SELECT rowid, {columns} FROM offers")
+    # Dropping offers drops its indexes and triggers with it
+    await db.execute("DROP TABLE offers")
+    await db.execute("ALTER TABLE offers_new RENAME TO offers")
+    await db.execute("CREATE INDEX idx_offers_created_at ON offers(created_at)")
+    await db.execute("CREATE INDEX idx_offers_search_id ON offers(search_id)")
+    await db.execute("CREATE INDEX idx_offers_salary ON offers(salary_monthly)")
+    await db.execute("CREATE INDEX idx_offers_city ON offers(city)")
+    await db.execute("CREATE INDEX idx_offers_geo ON offers(lat, lon)")
+    await db.execute("""
+        CREATE TRIGGER offers_after_insert AFTER INSERT ON offers BEGIN
+            INSERT INTO offers_fts (rowid, title) VALUES (new.rowid, new.title);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER offers_after_delete AFTER DELETE ON offers BEGIN
+            INSERT INTO offers_fts (offers_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+            DELETE FROM search_offers WHERE offer_rowid = old.rowid;
+        END
+    """)
+
+async def _migrate_salary_praca_only(db):
+    # 4: salaries are parsed for job ads only. Prices of cars and flats were
+    # stored as monthly pay, and "4300 zł za 1/2 etatu" as a minimum of 1 zł.
+    await db.execute("""
+        UPDATE offers SET salary_min = NULL, salary_max = NULL, salary_period = NULL, salary_monthly = NULL
+        WHERE search_id IN (SELECT id FROM searches WHERE COALESCE(category, 'praca') != 'praca')
+    """)
+    async with db.execute("""
+        SELECT rowid, price FROM offers
+        WHERE salary_min IS NOT NULL AND price GLOB '*[0-9]/[0-9]*'
+    """) as cursor:
+        rows = await cursor.fetchall()
+    updates = []
+    for rowid, price in rows:
+        low, high, period = normalize.parse_salary(price) or (None, None, None)
+        updates.append((low, high, period, normalize.monthly(high, period), rowid))
+    await db.executemany("""
+        UPDATE offers SET salary_min = ?, salary_max = ?, salary_period = ?, salary_monthly = ? WHERE rowid = ?
+    """, updates)
+    await db.execute("""
+        UPDATE search_offers SET salary_monthly = (SELECT salary_monthly FROM offers WHERE rowid = offer_rowid)
+        WHERE salary_monthly IS NOT NULL
+    """)
+
+MIGRATIONS = (_migrate_base_schema, _migrate_page_cache, _migrate_offers_set_null, _migrate_salary_praca_only)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+async def init_db():
+    # Migrations run on a connection of their own, before the pool opens:
+    # a connection that has loaded the old schema can keep using stale
+    # foreign key definitions after a table rebuild ("no such table").
+    await close_db()
+    async with aiosqlite.connect(DB_NAME, timeout=BUSY_TIMEOUT) as db:
+        # auto_vacuum only takes effect before the database header is first
+        # written, which journal_mode=WAL does, so it goes first. On an
+        # existing database it is a no-op; run_maintenance converts those.
+        async with db.execute("PRAGMA user_version") as cursor:
+            if (await cursor.fetchone())[0] == 0:
+                await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        for pragma in PRAGMAS:
+            await db.execute(pragma)
+        await _migrate(db)
+    await get_pool()
+
+async def _migrate(db):
+    async with db.execute("PRAGMA user_version") as cursor:
+        version = (await cursor.fetchone())[0]
+    if version >= SCHEMA_VERSION:
+        return
+    for number, migrate in enumerate(MIGRATIONS[version:], version + 1):
+        # Each step and its version bump commit together, so a crash
+        # mid-migration leaves the database at the previous version
+        await db.execute("BEGIN")
+        try:
+            await migrate(db)
+            await db.execute(f"PRAGMA user_version = {number}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    print(f"Database schema migrated from version {version} to {SCHEMA_VERSION}")
+
+@timed
+async def add_search(user_id, channel_id, url, city, query, category, filters_json, rules_json=None, backfill_pages=0):
+    async with connection() as db:
         cursor = await db.execute("""
-            INSERT INTO searches (user_id, channel_id, url, city, query, category, filters)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, channel_id, url, city, query, category, filters_json))
+            INSERT INTO searches (user_id, channel_id, url, city, query, category, filters, rules, backfill_pages)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, channel_id, url, city, query, category, filters_json, rules_json, backfill_pages))
         await db.commit()
         return cursor.lastrowid
 
+@timed
 async def get_searches():
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
+    async with connection() as db:
         async with db.execute("SELECT * FROM searches") as cursor:
             return await cursor.fetchall()
 
+@timed
 async def get_user_searches(user_id):
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
+    async with connection() as db:
         async with db.execute("SELECT * FROM searches WHERE user_id = ?", (user_id,)) as cursor:
             return await cursor.fetchall()
 
+@timed
 async def remove_search(search_id, user_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connection() as db:
         await db.execute("DELETE FROM searches WHERE id = ? AND user_id = ?", (search_id, user_id))
         await db.commit()
 
+@timed
+async def update_search_state(search_ids, cursor_json, poll_interval=None, page=None):
+    # Stores the high-water mark, check time and polling interval for all
+    # searches sharing a URL. poll_interval=None keeps the stored one.
+    # page=(url, validators) stores the page cache entry in the same
+    # transaction, so cursor and cache never disagree after a restart;
+    # validators=None drops it.
+    async with transaction() as db:
+        await db.executemany("""
+            UPDATE searches
+            SET offer_cursor = ?, poll_interval = COALESCE(?, poll_interval), last_checked = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, [(cursor_json, poll_interval, search_id) for search_id in search_ids])
+        if page:
+            url, validators = page
+            if validators:
+                await db.execute("""
+                    INSERT OR REPLACE INTO page_cache (url, etag, last_modified, hash, updated_at)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """, (url, validators["etag"], validators["last_modified"], validators["hash"]))
+            else:
+                await db.execute("DELETE FROM page_cache WHERE url = ?", (url,))
+
+@timed
+async def get_page_cache():
+    # url -> {"etag", "last_modified", "hash"}, the shape scraper.Fetcher keeps
+    async with connection() as db:
+        async with db.execute("SELECT url, etag, last_modified, hash FROM page_cache") as cursor:
+            return {row['url']: {"etag": row['etag'], "last_modified": row['last_modified'], "hash": row['hash']}
+                    for row in await cursor.fetchall()}
+
+@timed
 async def offer_exists(offer_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connection() as db:
         async with db.execute("SELECT 1 FROM offers WHERE id = ?", (offer_id,)) as cursor:
             return await cursor.fetchone() is not None
 
+@timed
+async def get_delivered(offer_ids, search_ids):
+    # Dedup state of offers for the searches sharing one URL: offer id ->
+    # set of those searches it was already delivered to (search_offers),
+    # for offers in the offers table, or None for expired offers, which
+    # count as delivered everywhere. Unknown ids are left out.
+    # One query per SQLITE_MAX_VARS ids and table.
+    unique_ids = list(dict.fromkeys(offer_ids))
+    search_ids = list(search_ids)
+    search_placeholders = ",".join("?" * len(search_ids))
+    step = SQLITE_MAX_VARS - len(search_ids)
+    delivered = {}
+    async with connection() as db:
+        for i in range(0, len(unique_ids), step):
+            chunk = unique_ids[i:i + step]
+            placeholders = ",".join("?" * len(chunk))
+            async with db.execute(f"""
+                SELECT o.id, s.search_id FROM offers o
+                LEFT JOIN search_offers s ON s.offer_rowid = o.rowid AND s.search_id IN ({search_placeholders})
+                WHERE o.id IN ({placeholders})
+            """, search_ids + chunk) as cursor:
+                for offer_id, search_id in await cursor.fetchall():
+                    searches = delivered.setdefault(offer_id, set())
+                    if search_id is not None:
+                        searches.add(search_id)
+
+        remaining = {fingerprint(offer_id): offer_id for offer_id in unique_ids if offer_id not in delivered}
+        fingerprints = list(remaining)
+        for i in range(0, len(fingerprints), SQLITE_MAX_VARS):
+            chunk = fingerprints[i:i + SQLITE_MAX_VARS]
+            placeholders = ",".join("?" * len(chunk))
+            async with db.execute(f"SELECT fingerprint FROM offer_fingerprints WHERE fingerprint IN ({placeholders})", chunk) as cursor:
+                for row in await cursor.fetchall():
+                    delivered[remaining[row[0]]] = None
+    return delivered
+
+@timed
+async def get_offer_ids_since(rowid, limit):
+    # (rowid, id) pairs in rowid order, for building the seen index
+    async with connection() as db:
+        async with db.execute("SELECT rowid, id FROM offers WHERE rowid > ? ORDER BY rowid LIMIT ?", (rowid, limit)) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+async def get_fingerprints_after(fingerprint, limit):
+    # Expired offers' fingerprints in order, after the given one (None: from the start)
+    if fingerprint is None:
+        query, params = "SELECT fingerprint FROM offer_fingerprints ORDER BY fingerprint LIMIT ?", (limit,)
+    else:
+        query, params = "SELECT fingerprint FROM offer_fingerprints WHERE fingerprint > ? ORDER BY fingerprint LIMIT ?", (fingerprint, limit)
+    async with connection() as db:
+        async with db.execute(query, params) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+async def count_fingerprints():
+    async with connection() as db:
+        async with db.execute("SELECT COUNT(*) FROM offer_fingerprints") as cursor:
+            return (await cursor.fetchone())[0]
+
+async def count_offers():
+    async with connection() as db:
+        async with db.execute("SELECT count(*) FROM offers") as cursor:
+            return (await cursor.fetchone())[0]
+
+async def max_offer_rowid():
+    async with connection() as db:
+        async with db.execute("SELECT coalesce(max(rowid), 0) FROM offers") as cursor:
+            return (await cursor.fetchone())[0]
+
 async def add_offer(offer_id, search_id, title, price, url):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-            INSERT INTO offers (id, search_id, title, price, url)
-            VALUES (?, ?, ?, ?, ?)
-        """, (offer_id, search_id, title, price, url))
+    await add_offers([(offer_id, search_id, title, price, url)])
+
+@timed
+async def add_offers(rows):
+    # rows: iterable of (offer_id, search_id, title, price, url), written in one transaction
+    rows = list(rows)
+    if not rows:
+        return
+    async with connection() as db:
+        await db.executemany("""
+            INSERT OR IGNORE INTO offers (id, search_id, title, price, url)
+            VALUES (?, (SELECT id FROM searches WHERE id = ?), ?, ?, ?)
+        """, rows)
         await db.commit()
 
-# Cleanup function to remove offers that are no longer relevant might be complex
-# For now, we keep them to prevent re-alerting if they reappear or if the cleanup logic is buggy.
-# We could delete old offers periodically.
+@timed
+async def add_offers_with_outbox(offer_rows, outbox_rows):
+    # offer_rows: (offer_id, search_id, title, price, url, salary_min,
+    #   salary_max, salary_period, salary_monthly, city, district, lat, lon)
+    # outbox_rows: (offer_id, search_id, channel_id, user_id, payload_json)
+    # Both are written in one transaction. Returns the outbox ids in order.
+    # A search removed while its check was running is recorded as NULL
+    # (owner) or skipped (history) instead of failing the foreign key.
+    outbox_ids = []
+    async with transaction() as db:
+        await db.executemany("""
+            INSERT OR IGNORE INTO offers (id, search_id, title, price, url, salary_min, salary_max,
+                                          salary_period, salary_monthly, city, district, lat, lon)
+            VALUES (?, (SELECT id FROM searches WHERE id = ?), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, offer_rows)
+        for row in outbox_rows:
+            cursor = await db.execute("""
+                INSERT INTO outbox (offer_id, search_id, channel_id, user_id, payload)
+                VALUES (?, ?, ?, ?, ?)
+            """, row)
+            outbox_ids.append(cursor.lastrowid)
+        await db.executemany("""
+            INSERT OR IGNORE INTO search_offers (search_id, offer_rowid, salary_monthly)
+            SELECT s.id, o.rowid, o.salary_monthly FROM offers o JOIN searches s ON s.id = ?
+            WHERE o.id = ?
+        """, [(row[1], row[0]) for row in outbox_rows])
+    return outbox_ids
+
+def _fts_query(text):
+    # User text -> FTS5 query: every word must appear, the last one as a
+    # prefix ("java dev" finds "Java Developer"). Quoting keeps FTS syntax
+    # characters in the input from being interpreted.
+    words = [w.replace('"', '""') for w in text.split()]
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words[:-1]) + (" " if len(words) > 1 else "") + f'"{words[-1]}"*'
+
+@timed
+async def get_offer_history(search_id, sort="date", text=None, after=None, limit=HISTORY_PAGE_SIZE):
+    # One page of offers delivered to a search, newest or best paid first.
+    # Keyset pagination: pass the returned cursor as `after` for the next
+    # page; None means there are no more. Every page is an index range scan
+    # on search_offers, however deep into the history it is. Sorting by
+    # salary leaves out offers without one.
+    conditions = ["s.search_id = ?"]
+    params = [search_id]
+    if sort == "salary":
+        conditions.append("s.salary_monthly IS NOT NULL")
+        if after:
+            conditions.append("(s.salary_monthly, s.offer_rowid) < (?, ?)")
+            params += after
+        order = "s.salary_monthly DESC, s.offer_rowid DESC"
+    else:
+        if after:
+            conditions.append("s.offer_rowid < ?")
+            params += after
+        order = "s.offer_rowid DESC"
+    query = _fts_query(text) if text else None
+    if query:
+        conditions.append("s.offer_rowid IN (SELECT rowid FROM offers_fts WHERE offers_fts MATCH ?)")
+        params.append(query)
+    params.append(limit + 1)
+
+    async with connection() as db:
+        async with db.execute(f"""
+            SELECT o.*, s.offer_rowid, s.salary_monthly AS sort_salary
+            FROM search_offers s JOIN offers o ON o.rowid = s.offer_rowid
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {order}
+            LIMIT ?
+        """, params) as cursor:
+            rows = await cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = [last['sort_salary'], last['offer_rowid']] if sort == "salary" else [last['offer_rowid']]
+    return rows, next_cursor
+
+@timed
+async def get_offers_near(lat, lon, radius_km, user_id=None, limit=50):
+    # Newest offers within radius_km of a point, optionally only those found
+    # by one user's searches. The bounding box is served by idx_offers_geo;
+    # the exact distance is checked here.
+    min_lat, max_lat, min_lon, max_lon = normalize.bounding_box(lat, lon, radius_km)
+    conditions = ["lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?"]
+    params = [min_lat, max_lat, min_lon, max_lon]
+    if user_id is not None:
+        conditions.append("""EXISTS (
+            SELECT 1 FROM search_offers so JOIN searches s ON s.id = so.search_id
+            WHERE so.offer_rowid = offers.rowid AND s.user_id = ?
+        )""")
+        params.append(user_id)
+    offers = []
+    async with connection() as db:
+        async with db.execute(f"""
+            SELECT * FROM offers
+            WHERE {" AND ".join(conditions)}
+            ORDER BY created_at DESC
+        """, params) as cursor:
+            async for row in cursor:
+                if normalize.distance_km(lat, lon, row['lat'], row['lon']) <= radius_km:
+                    offers.append(row)
+                    if len(offers) >= limit:
+                        break
+    return offers
+
+@timed
+async def get_pending_outbox():
+    async with connection() as db:
+        async with db.execute("SELECT * FROM outbox WHERE state = 'pending' ORDER BY id") as cursor:
+            return await cursor.fetchall()
+
+@timed
+async def mark_outbox(outbox_ids, state):
+    async with connection() as db:
+        await db.executemany("UPDATE outbox SET state = ? WHERE id = ?", [(state, outbox_id) for outbox_id in outbox_ids])
+        await db.commit()
+
+def fingerprint(offer_id):
+    # Signed 64-bit hash of an offer id, fits SQLite's INTEGER PRIMARY KEY
+    digest = hashlib.blake2b(offer_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+@timed
+async def run_maintenance(retention_days=OFFER_RETENTION_DAYS):
+    # Expires offers older than retention_days, keeping only their
+    # fingerprints, prunes old outbox rows, then releases free pages and
+    # refreshes planner statistics. Works in small batches so the write
+    # lock is never held for long. Meant to run off-peak.
+    result = {"expired": 0, "outbox_pruned": 0}
+    cutoff = f"-{retention_days} days"
+    async with connection() as db:
+        try:
+            while True:
+                async with db.execute(
+                    "SELECT id FROM offers WHERE created_at < datetime('now', ?) LIMIT ?", (cutoff, MAINTENANCE_BATCH)
+                ) as cursor:
+                    ids = [row[0] for row in await cursor.fetchall()]
+                if not ids:
+                    break
+                await db.executemany("INSERT OR IGNORE INTO offer_fingerprints (fingerprint) VALUES (?)", [(fingerprint(i),) for i in ids])
+                await db.executemany("DELETE FROM offers WHERE id = ?", [(i,) for i in ids])
+                await db.commit()
+                result["expired"] += len(ids)
+
+            cursor = await db.execute(
+                "DELETE FROM outbox WHERE state != 'pending' AND created_at < datetime('now', ?)", (f"-{OUTBOX_RETENTION_DAYS} days",)
+            )
+            result["outbox_pruned"] = cursor.rowcount
+            # Every live search is checked at least hourly, so older entries
+            # belong to removed searches
+            await db.execute("DELETE FROM page_cache WHERE updated_at < datetime('now', ?)", (f"-{PAGE_CACHE_RETENTION_DAYS} days",))
+            await db.commit()
+
+            async with db.execute("PRAGMA auto_vacuum") as cursor:
+                auto_vacuum = (await cursor.fetchone())[0]
+            if auto_vacuum != 2:
+                # Databases created before incremental vacuum need one full VACUUM to switch.
+                # VACUUM may renumber offers' rowids, which search_offers and
+                # offers_fts refer to, so both are remapped through the offer id.
+                await db.execute("DROP TABLE IF EXISTS temp.history_backup")
+                await db.execute("""
+                    CREATE TEMP TABLE history_backup AS
+                    SELECT s.search_id, o.id AS offer_id, s.salary_monthly
+                    FROM search_offers s JOIN offers o ON o.rowid = s.offer_rowid
+                """)
+                await db.commit()
+                await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                await db.execute("VACUUM")
+                await db.execute("DELETE FROM search_offers")
+                await db.execute("""
+                    INSERT OR IGNORE INTO search_offers (search_id, offer_rowid, salary_monthly)
+                    SELECT b.search_id, o.rowid, b.salary_monthly FROM temp.history_backup b JOIN offers o ON o.id = b.offer_id
+                """)
+                await db.execute("INSERT INTO offers_fts(offers_fts) VALUES ('rebuild')")
+                await db.execute("DROP TABLE temp.history_backup")
+                await db.commit()
+            else:
+                # incremental_vacuum frees one page per step, so read it to the end
+                async with db.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})") as cursor:
+                    await cursor.fetchall()
+            await db.execute("PRAGMA optimize")
+        except BaseException:
+            # Each batch commits on its own; only the one in progress is undone
+            await db.rollback()
+            raise
+    return result
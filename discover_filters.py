@@ -1,68 +1,103 @@
+import json
+import re
+import sys
+import time
+from urllib.parse import parse_qsl, unquote, urlsplit
+
 import requests
 from bs4 import BeautifulSoup
 
-def discover_filters():
-    url = "https://www.olx.pl/praca/warszawa/"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    
+import catalog
+import scraper
+
+# Builds the filter catalog (see catalog.py): for every category, the
+# enum filters OLX offers on its listing page, with their labels and values.
+# Run it directly to rebuild the cache by hand:
+#   python discover_filters.py [category ...]
+
+_ENUM_PARAM = re.compile(r"^search\[(filter_enum_[^\]]+)\]\[\d+\]$")
+
+def _filter_key(name):
+    # "search[filter_enum_agreement][0]" / "filter_enum_agreement" -> "agreement"
+    match = _ENUM_PARAM.match(name)
+    if match:
+        name = match.group(1)
+    return name[len("filter_enum_"):] if name.startswith("filter_enum_") else None
+
+def _option(value):
+    label = value.get('label') or value.get('name')
+    key = value.get('value') or value.get('key') or value.get('id')
+    if label is None or key is None:
+        return None
+    return str(label).strip(), str(key)
+
+def filters_from_state(state):
+    # Looks for filter definitions anywhere in the page state: objects with
+    # a filter_enum_* key and a list of {label, value} options. The exact
+    # path has moved between OLX releases, like the ads list.
+    filters = {}
+    stack = [state]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            name = node.get('key') or node.get('id') or node.get('name')
+            values = node.get('values') or node.get('options')
+            key = _filter_key(name) if isinstance(name, str) else None
+            if key and isinstance(values, list):
+                options = [o for o in (_option(v) for v in values if isinstance(v, dict)) if o]
+                if options and key not in filters:
+                    filters[key] = {"label": str(node.get('label') or node.get('title') or key), "options": options}
+            stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(v for v in node if isinstance(v, (dict, list)))
+    return filters
+
+def filters_from_links(html):
+    # Fallback: filter links on the page (search[filter_enum_x][0]=value),
+    # labelled with the link text
+    filters = {}
+    soup = BeautifulSoup(html, 'html.parser')
+    for link in soup.find_all('a', href=True):
+        if 'filter_enum_' not in unquote(link['href']):
+            continue
+        label = link.get_text(strip=True)
+        for name, value in parse_qsl(urlsplit(link['href']).query):
+            key = _filter_key(name)
+            if key and label:
+                options = filters.setdefault(key, {"label": key, "options": []})["options"]
+                if all(v != value for _, v in options):
+                    options.append((label, value))
+    return filters
+
+def discover_category(category):
+    url = f"https://www.olx.pl/{category}/"
     print(f"Fetching {url}...")
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        print(f"Failed to fetch page: {response.status_code}")
-        return
+    response = requests.get(url, headers=scraper.HEADERS, timeout=30)
+    response.raise_for_status()
+    state = scraper.extract_embedded_state(response.text)
+    filters = filters_from_state(state) if state is not None else {}
+    return filters or filters_from_links(response.text)
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    # Look for form inputs that might be filters
-    # Usually they are inputs with names starting with search[
-    
-    import json
-    
-    script_tag = soup.find('script', {'id': '__NEXT_DATA__'})
-    if script_tag:
-        print("Found __NEXT_DATA__ script!")
+def build_catalog(categories=catalog.CATEGORIES):
+    # {"version", "built_at", "categories": {category: {key: {label, options}}}}
+    # Categories that fail to load are left out; catalog.load falls back
+    # to the built-in defaults for them.
+    built = {}
+    for category in categories:
         try:
-            data = json.loads(script_tag.string)
-            # Traverse to find filter configuration
-            # Usually in props -> pageProps -> state -> adListing -> filters or similar
-            # Or data -> ...
-            
-            # Let's verify keys first to guess path
-            print("Keys in data:", data.keys())
-            if 'props' in data:
-                print("Keys in props:", data['props'].keys())
-                if 'pageProps' in data['props']:
-                    pp = data['props']['pageProps']
-                    print("Keys in pageProps:", pp.keys())
-                    
-                    # Try to locate filters
-                    # Often in 'listing' or 'search'
-                    # Let's serialize specific parts to file to read
-                    with open("next_data_dump.json", "w", encoding="utf-8") as f:
-                        json.dump(pp, f, indent=2)
-                    print("Dumped pageProps to next_data_dump.json")
-                    
+            filters = discover_category(category)
         except Exception as e:
-            print(f"Error parsing JSON: {e}")
-    else:
-        print("__NEXT_DATA__ not found.")
-
-    # Also checking if there are any 'a' tags with hrefs containing filter patterns as a fallback
-    links = soup.find_all('a', href=True)
-    potential_filters = set()
-    for link in links:
-        href = link['href']
-        if 'search[' in href:
-            potential_filters.add(href)
-            
-    if potential_filters:
-        print(f"Found {len(potential_filters)} links with search parameters.")
-        for p in list(potential_filters)[:5]:
-            print(f"Sample: {p}")
-
+            print(f"Error discovering filters for {category}: {e}")
+            continue
+        if filters:
+            built[category] = filters
+            print(f"{category}: {len(filters)} filters")
+        else:
+            print(f"{category}: no filters found")
+    return {"version": catalog.CATALOG_VERSION, "built_at": time.time(), "categories": built}
 
 if __name__ == "__main__":
-    discover_filters()
+    data = build_catalog(sys.argv[1:] or catalog.CATEGORIES)
+    catalog.save(data)
+    print(f"Saved {catalog.CATALOG_PATH}")
+    print(json.dumps(data["categories"], ensure_ascii=False, indent=2)[:2000])
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import aiohttp
+import discord
+
+import metrics
+
+MAX_EMBEDS = 10           # Discord's limit per message
+QUEUE_SIZE = 100          # embeds buffered per channel before submit_nowait() refuses
+RETRY_BASE = 2.0          # seconds before the first retry, doubled each time
+RETRY_MAX = 60.0
+
+class Dispatcher:
+    """Delivers offer embeds to Discord channels.
+
+    Each channel has its own bounded queue and worker, so channels are
+    served concurrently while messages within a channel keep their order.
+    Consecutive embeds for the same user are packed into one message.
+    Rate limits are left to discord.py, which tracks Discord's per-route
+    buckets and waits out 429s. Sends that fail with a 5xx, a network error
+    or a timeout are retried with backoff until they go through; any other
+    4xx (missing channel, permissions, an embed Discord rejects) is
+    permanent and drops the message, which is reported as not delivered.
+
+    on_result(keys, delivered) is awaited after every message with the
+    keys passed to submit_nowait() for the embeds it carried."""
+    def __init__(self, on_result=None):
+        self.on_result = on_result
+        self.queues = {}   # channel id -> asyncio.Queue of (key, user_id, embed)
+        self.workers = {}  # channel id -> asyncio.Task
+        self.channels = {}
+        self.keys = set()  # keys queued or being sent
+        self.settled = None  # keys finished since watch_settled(), while watching
+
+    def _queue(self, channel):
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = asyncio.Queue(QUEUE_SIZE)
+            self.channels[channel.id] = channel
+            self.workers[channel.id] = asyncio.create_task(self._worker(channel.id))
+        return queue
+
+    def submit_nowait(self, channel, user_id, embed, key=None):
+        # False when the channel's queue is full, so one slow channel can't
+        # hold up the caller; the caller keeps the embed and retries later
+        try:
+            self._queue(channel).put_nowait((key, user_id, embed))
+        except asyncio.QueueFull:
+            return False
+        self.keys.add(key)
+        return True
+
+    def queued(self, key):
+        return key in self.keys
+
+    def watch_settled(self):
+        # Records keys that finish from now on until settled is set back to None
+        self.settled = set()
+        return self.settled
+
+    def pending(self):
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    async def join(self):
+        # Waits until everything submitted so far has been delivered
+        await asyncio.gather(*(queue.join() for queue in self.queues.values()))
+
+    async def close(self):
+        for task in self.workers.values():
+            task.cancel()
+        await asyncio.gather(*self.workers.values(), return_exceptions=True)
+        self.workers = {}
+        self.queues = {}
+        self.channels = {}
+        self.keys = set()
+
+    def _batches(self, items):
+        # Packs consecutive embeds for the same user into one message
+        batches = []
+        for key, user_id, embed in items:
+            if batches and batches[-1][0] == user_id:
+                batches[-1][1].append(key)
+                batches[-1][2].append(embed)
+            else:
+                batches.append((user_id, [key], [embed]))
+        return batches
+
+    async def _worker(self, channel_id):
+        queue = self.queues[channel_id]
+        channel = self.channels[channel_id]
+        while True:
+            items = [await queue.get()]
+            while len(items) < MAX_EMBEDS and not queue.empty():
+                items.append(queue.get_nowait())
+            for user_id, keys, embeds in self._batches(items):
+                try:
+                    delivered = await self._send(channel, user_id, embeds)
+                    if self.on_result:
+                        await self.on_result(keys, delivered)
+                except Exception as e:
+                    print(f"Error delivering to channel {channel.id}: {e}")
+                finally:
+                    self.keys.difference_update(keys)
+                    if self.settled is not None:
+                        self.settled.update(keys)
+                    for _ in embeds:
+                        queue.task_done()
+
+    async def _send(self, channel, user_id, embeds):
+        content = f"<@{user_id}> New Offer!" if len(embeds) == 1 else f"<@{user_id}> {len(embeds)} New Offers!"
+        delay = RETRY_BASE
+        while True:
+            try:
+                start = time.perf_counter()
+                await channel.send(content, embeds=embeds)
+                metrics.observe("send", time.perf_counter() - start)
+                return True
+            except discord.HTTPException as e:
+                if e.status < 500 and e.status != 429:
+                    print(f"Dropping {len(embeds)} offers for channel {channel.id}: {e}")
+                    return False
+                print(f"Send to channel {channel.id} failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Send to channel {channel.id} failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
@@ -0,0 +1,113 @@
+import os
+import time
+
+from aiohttp import web
+
+import database
+
+# Local Prometheus-style endpoint; set METRICS_PORT=0 to disable it
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Stage timings: stage -> {"count", "total", "max"} (seconds)
+# Stages: fetch (HTTP incl. rate limiting), parse, send (channel.send)
+stages = {}
+
+# Per-search counters, keyed by canonical search URL
+SEARCH_COUNTERS = ("checks", "pages", "not_modified", "cards", "new_offers", "parse_failures", "fetch_errors",
+                    "blocked", "layout_errors", "seconds")
+searches = {}
+
+started_at = time.time()
+
+def observe(stage, seconds):
+    entry = stages.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0})
+    entry["count"] += 1
+    entry["total"] += seconds
+    entry["max"] = max(entry["max"], seconds)
+
+def count(url, **deltas):
+    entry = searches.get(url)
+    if entry is None:
+        entry = searches[url] = dict.fromkeys(SEARCH_COUNTERS, 0)
+    for name, value in deltas.items():
+        entry[name] += value
+
+def forget(url):
+    searches.pop(url, None)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render():
+    # Prometheus text exposition format
+    lines = [
+        "# TYPE jobfinder_uptime_seconds gauge",
+        f"jobfinder_uptime_seconds {time.time() - started_at:.0f}",
+        "# TYPE jobfinder_stage_seconds summary",
+    ]
+    for stage, entry in sorted(stages.items()):
+        lines.append(f'jobfinder_stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+        lines.append(f'jobfinder_stage_seconds_sum{{stage="{stage}"}} {entry["total"]:.6f}')
+        lines.append(f'jobfinder_stage_seconds_max{{stage="{stage}"}} {entry["max"]:.6f}')
+
+    lines.append("# TYPE jobfinder_db_seconds summary")
+    for name, entry in sorted(database.stats.items()):
+        lines.append(f'jobfinder_db_seconds_count{{op="{name}"}} {entry["calls"]}')
+        lines.append(f'jobfinder_db_seconds_sum{{op="{name}"}} {entry["total"]:.6f}')
+        lines.append(f'jobfinder_db_seconds_max{{op="{name}"}} {entry["max"]:.6f}')
+
+    for counter in SEARCH_COUNTERS:
+        metric = f"jobfinder_search_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for url, entry in sorted(searches.items()):
+            value = f"{entry[counter]:.6f}" if counter == "seconds" else entry[counter]
+            lines.append(f'{metric}{{search="{_label(url)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def summary(top=5):
+    # Short human-readable version for the !stats command
+    lines = ["**Stages** (count / avg / max)"]
+    all_stages = {**stages, **{f"db:{name}": {"count": e["calls"], "total": e["total"], "max": e["max"]} for name, e in database.stats.items()}}
+    for stage, entry in sorted(all_stages.items()):
+        avg = entry["total"] / entry["count"] * 1000 if entry["count"] else 0.0
+        lines.append(f"`{stage}`: {entry['count']} / {avg:.1f} ms / {entry['max'] * 1000:.1f} ms")
+
+    totals = dict.fromkeys(SEARCH_COUNTERS, 0)
+    for entry in searches.values():
+        for name in SEARCH_COUNTERS:
+            totals[name] += entry[name]
+    lines.append(
+        f"\n**Searches**: {len(searches)} | pages {totals['pages']} | unchanged {totals['not_modified']} | "
+        f"cards {totals['cards']} | new {totals['new_offers']} | parse failures {totals['parse_failures']} | "
+        f"fetch errors {totals['fetch_errors']} | blocked {totals['blocked']} | layout errors {totals['layout_errors']}"
+    )
+
+    busiest = sorted(searches.items(), key=lambda item: item[1]["seconds"], reverse=True)[:top]
+    if busiest:
+        lines.append(f"\n**Top {len(busiest)} by time**")
+        for url, entry in busiest:
+            lines.append(f"{entry['seconds']:.1f}s | {entry['pages']} pages | {entry['new_offers']} new | <{url}>")
+    return "\n".join(lines)
+
+async def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    # Returns the runner (for cleanup), or None when disabled or the port
+    # can't be bound: the bot runs fine without the endpoint
+    if not port:
+        return None
+
+    async def handle(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"Metrics endpoint disabled, can't listen on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,109 @@
+import csv
+import functools
+import math
+import os
+import re
+import unicodedata
+
+# Offline city table (name, lat, lon) used to place offers on the map
+CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities_pl.csv")
+
+# Conversions to a monthly amount, so salaries quoted per hour or per year
+# can be compared and sorted together
+PER_MONTH = {"hour": 168, "day": 21, "week": 4.33, "month": 1, "year": 1 / 12}
+
+_PERIODS = (
+    (re.compile(r"godz|/\s*h\b|hour"), "hour"),
+    (re.compile(r"dzie[nń]|dniówk|/\s*d\b"), "day"),
+    (re.compile(r"tydz|tygodn"), "week"),
+    (re.compile(r"/\s*rok|rocznie|roczn"), "year"),
+)
+# Fractions of a full-time job ("1/2 etatu") aren't amounts
+_FRACTION = re.compile(r"\b\d\s*/\s*\d\b")
+_NUMBER = re.compile(r"\d{1,3}(?:[ \u00a0]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?")
+
+EARTH_RADIUS_KM = 6371.0
+
+def parse_salary(price):
+    # "5 000 - 7 000 zł / mies." -> (5000.0, 7000.0, "month")
+    # "35 zł / godz." -> (35.0, 35.0, "hour"); no amount -> None
+    amounts = _FRACTION.sub(" ", price or "")
+    numbers = [float(re.sub(r"[ \u00a0]", "", n).replace(",", ".")) for n in _NUMBER.findall(amounts)]
+    if not numbers:
+        return None
+    text = price.lower()
+    period = next((name for pattern, name in _PERIODS if pattern.search(text)), "month")
+    return min(numbers), max(numbers), period
+
+def monthly(amount, period):
+    if amount is None:
+        return None
+    return round(amount * PER_MONTH.get(period, 1), 2)
+
+def format_salary(offer):
+    # Text for embeds, e.g. "5 000 – 7 000 zł / mies."; falls back to the raw price
+    if offer.get('salary_min') is None:
+        return offer.get('price') or "N/A"
+    low, high = (f"{v:,.0f}".replace(",", " ") for v in (offer['salary_min'], offer['salary_max']))
+    amount = low if low == high else f"{low} – {high}"
+    unit = {"hour": "godz.", "day": "dzień", "week": "tydz.", "month": "mies.", "year": "rok"}[offer['salary_period']]
+    return f"{amount} zł / {unit}"
+
+def fold(name):
+    # "Kraków" -> "krakow", "Bielsko-Biała" -> "bielsko biala"
+    name = name.replace("ł", "l").replace("Ł", "L")
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(re.split(r"[\s\-_]+", name.casefold().strip()))
+
+@functools.lru_cache(maxsize=1)
+def cities():
+    # folded name -> (name, lat, lon); read once, on first use
+    table = {}
+    with open(CITIES_PATH, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            table[fold(row['name'])] = (row['name'], float(row['lat']), float(row['lon']))
+    return table
+
+@functools.lru_cache(maxsize=4096)
+def resolve_location(location):
+    # "Kraków, Stare Miasto" -> ("Kraków", "Stare Miasto", 50.0647, 19.945)
+    # Unknown towns keep their name without coordinates; no city -> None
+    if not location or location == "N/A":
+        return None
+    city, _, district = (part.strip() for part in location.partition(","))
+    if not city:
+        return None
+    known = cities().get(fold(city))
+    if known is None:
+        return city, district or None, None, None
+    name, lat, lon = known
+    return name, district or None, lat, lon
+
+def distance_km(lat1, lon1, lat2, lon2):
+    # Haversine
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def bounding_box(lat, lon, radius_km):
+    # (min_lat, max_lat, min_lon, max_lon) around a point, for index range scans
+    dlat = radius_km / 111.0
+    dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+def normalize_offer(offer, category="praca"):
+    # Adds salary_min/max/period and city/district/lat/lon to a parsed offer.
+    # Only job ads have a salary; in other categories the price is a price.
+    # Coordinates from the listing itself win over the city table.
+    salary = parse_salary(offer.get('price')) if category == "praca" else None
+    offer['salary_min'], offer['salary_max'], offer['salary_period'] = salary or (None, None, None)
+
+    place = resolve_location(offer.get('location'))
+    offer['city'], offer['district'], lat, lon = place or (None, None, None, None)
+    if offer.get('lat') is None or offer.get('lon') is None:
+        offer['lat'], offer['lon'] = lat, lon
+    return offer
+
@@ -0,0 +1,363 @@
+import asyncio
+import json
+import time
+
+import database
+import dispatcher
+import metrics
+import normalize
+import rules
+import scraper
+import seen_index
+import workers
+
+# Stage concurrency and queue bounds
+FETCH_WORKERS = scraper.MAX_CONCURRENCY
+QUEUE_SIZE = 100
+SEEN_FLUSH_SECONDS = 60  # how often the seen index header is persisted
+OUTBOX_RETRY_SECONDS = 30  # pause between passes re-queuing outbox rows that didn't fit
+
+class CheckJob:
+    """One search URL travelling through the pipeline.
+
+    A URL without a cursor (never checked) can be backfilled: up to
+    backfill_pages pages are read instead of just the first. Pages stream
+    through the stages one at a time, so the first notifications go out
+    while the crawl continues, and a job keeps only counters and the few
+    newest offers the cursor needs, however many pages it reads."""
+    def __init__(self, url, subscribers, cursor, backfill_pages=0):
+        self.url = url
+        self.subscribers = subscribers  # [(search row, channel)]
+        self.cursor = cursor
+        self.known_ids = frozenset(cursor)
+        self.backfill = bool(backfill_pages) and not cursor
+        self.max_pages = backfill_pages if self.backfill else scraper.MAX_PAGES
+        # Subscribers share the URL, and with it the category
+        self.category = subscribers[0][0]['category'] or "praca"
+        self.matcher = rules.matcher_for(tuple(search['rules'] for search, _ in subscribers))
+        self.newest = []                # first regular offers parsed, for the cursor
+        self.parsed = 0
+        self.new_count = 0
+        self.failed = False             # a page couldn't be fetched or read
+        self.done = asyncio.get_running_loop().create_future()
+
+class Pipeline:
+    """fetch -> parse -> dedup -> outbox -> deliver, connected by bounded queues.
+
+    Fetch workers read pages from Fetcher.stream_pages, which parses them
+    in the fetcher's process pool, and a single dedup worker records new
+    offers together with their outbox rows in one transaction. Delivery
+    is the dispatcher, which marks outbox rows sent or failed. Dedup hands
+    notifications over without waiting: the outbox row is already durable,
+    so when a channel's queue is full the row stays pending and the outbox
+    worker queues it later, and one slow channel can't stall the pipeline.
+    The same worker picks up whatever was pending at shutdown once
+    request_resume() is called, so a crash or failed send never loses a
+    notification.
+
+    on_checked(url, new_count, failed) is called when a URL is fully
+    processed and may return a polling interval to persist with the search.
+
+    With shards > 0 the fetch and parse stages run in separate scraper
+    processes (workers.ShardPool) and only dedup and delivery stay here.
+
+    Dedup asks the seen index (a Bloom filter at seen_path) first and only
+    queries SQLite for offers it reports as probably seen. seen_path=None
+    checks every offer in SQLite."""
+    def __init__(self, fetcher, get_channel, build_embed, on_checked=None, shards=workers.SCRAPER_WORKERS,
+                 seen_path=seen_index.SEEN_INDEX_PATH):
+        self.fetcher = fetcher
+        self.get_channel = get_channel
+        self.build_embed = build_embed
+        self.on_checked = on_checked
+        self.shards = shards
+        self.shard_pool = None
+        self.seen_path = seen_path
+        self.seen = None
+        self.seen_flushed = 0.0
+        self.dispatcher = dispatcher.Dispatcher(on_result=self.on_delivered)
+        self.tasks = []
+
+    async def start(self):
+        if self.seen_path:
+            self.seen = await seen_index.load(self.seen_path)
+            self.seen_flushed = time.monotonic()
+        # Validators from before the restart: unchanged first pages are
+        # skipped on the first sweep too. With shards the fetcher's cache is
+        # the copy jobs are seeded from and worker results are written back to.
+        self.fetcher.page_cache.update(await database.get_page_cache())
+        self.fetch_queue = asyncio.Queue(QUEUE_SIZE)
+        self.dedup_queue = asyncio.Queue(QUEUE_SIZE)
+        self.outbox_wanted = asyncio.Event()
+        # One dedup worker: it keeps page order within a job and makes
+        # "check unseen, then insert" atomic across URLs sharing an offer.
+        self.tasks = [asyncio.create_task(self._dedup_worker()), asyncio.create_task(self._outbox_worker())]
+        if self.shards:
+            self.jobs = {}  # job id -> CheckJob handed to a scraper process
+            self.next_job_id = 0
+            self.in_flight = asyncio.Semaphore(QUEUE_SIZE)
+            self.shard_pool = workers.ShardPool(self.shards, self._on_worker_message, self.fetcher.limiter.interval)
+            await self.shard_pool.start()
+        else:
+            self.tasks += [asyncio.create_task(self._fetch_worker()) for _ in range(FETCH_WORKERS)]
+
+    async def close(self):
+        if self.shard_pool:
+            await self.shard_pool.close()
+            self.shard_pool = None
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.dispatcher.close()
+        if self.seen:
+            # The watermark is left where the dedup worker last put it, so
+            # anything recorded since then is read back on the next start.
+            self.seen.close()
+            self.seen = None
+
+    async def submit(self, url, subscribers, cursor, backfill_pages=0):
+        # Waits while the pipeline is full (backpressure on the scheduler)
+        job = CheckJob(url, subscribers, cursor, backfill_pages)
+        metrics.count(url, checks=1)
+        if self.shard_pool:
+            await self.in_flight.acquire()
+            self.next_job_id += 1
+            self.jobs[self.next_job_id] = job
+            self.shard_pool.submit(self.next_job_id, url, job.cursor, job.max_pages, job.backfill,
+                                   self.fetcher.page_cache.get(url))
+        else:
+            await self.fetch_queue.put(job)
+        return job
+
+    async def _on_worker_message(self, message):
+        # Results from scraper processes enter the pipeline at the dedup stage
+        kind, job_id = message[0], message[1]
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if kind == "page":
+            _, _, offers, failures, fetch_seconds, parse_seconds = message
+            self._page_fetched(job, fetch_seconds, offers is not None)
+            if offers is not None:
+                self._page_parsed(job, offers, failures, parse_seconds)
+                await self.dedup_queue.put((job, offers))
+        elif kind == "error":
+            _, _, status, error = message
+            self._failed(job, status, error)
+        elif kind == "done":
+            validators = message[2]
+            if validators:
+                self.fetcher.page_cache[job.url] = validators
+            else:
+                self.fetcher.page_cache.pop(job.url, None)
+            del self.jobs[job_id]
+            self.in_flight.release()
+            await self.dedup_queue.put((job, None))
+
+    def _page_fetched(self, job, seconds, modified):
+        metrics.observe("fetch", seconds)
+        metrics.count(job.url, seconds=seconds, **({"pages": 1} if modified else {"not_modified": 1}))
+
+    def _page_parsed(self, job, offers, failures, seconds):
+        metrics.observe("parse", seconds)
+        metrics.count(job.url, cards=len(offers) + failures, parse_failures=failures, seconds=seconds)
+
+    def _failed(self, job, status, error):
+        # The job ends early and keeps its old cursor (see _finish)
+        job.failed = True
+        counter = {scraper.BLOCKED: "blocked", scraper.PARSE_FAILURE: "layout_errors"}.get(status, "fetch_errors")
+        metrics.count(job.url, **{counter: 1})
+        print(f"Error fetching offers ({status}): {error}")
+
+    def request_resume(self):
+        # Asks the outbox worker for a pass; call once channels can be looked up
+        self.outbox_wanted.set()
+
+    async def _outbox_worker(self):
+        while True:
+            await self.outbox_wanted.wait()
+            self.outbox_wanted.clear()
+            try:
+                await self.resume_outbox()
+            except Exception as e:
+                print(f"Error resuming outbox: {e}")
+            await asyncio.sleep(OUTBOX_RETRY_SECONDS)
+
+    async def resume_outbox(self):
+        # Queues pending notifications the dispatcher doesn't already hold.
+        # Channels whose queue is full are left for the next pass.
+        # Rows delivered while the query runs can still read as pending
+        settled = self.dispatcher.watch_settled()
+        try:
+            rows = await database.get_pending_outbox()
+            resumed, full = await self._requeue(rows, settled)
+        finally:
+            self.dispatcher.settled = None
+        if full:
+            self.outbox_wanted.set()
+        if resumed:
+            print(f"Resumed {resumed} pending notifications")
+
+    async def _requeue(self, rows, settled):
+        resumed = 0
+        full = set()
+        for row in rows:
+            if row['channel_id'] in full or row['id'] in settled or self.dispatcher.queued(row['id']):
+                continue
+            channel = self.get_channel(row['channel_id'])
+            if not channel:
+                await database.mark_outbox([row['id']], "failed")
+                continue
+            payload = json.loads(row['payload'])
+            embed = self.build_embed({'query': payload['query']}, payload)
+            if not self.dispatcher.submit_nowait(channel, row['user_id'], embed, key=row['id']):
+                full.add(row['channel_id'])
+                continue
+            resumed += 1
+        return resumed, full
+
+    async def on_delivered(self, outbox_ids, delivered):
+        await database.mark_outbox(outbox_ids, "sent" if delivered else "failed")
+
+    async def _fetch_worker(self):
+        while True:
+            job = await self.fetch_queue.get()
+            try:
+                # Parsing happens in the fetcher's process pool; page N+1 is
+                # downloaded while dedup handles page N, and only if nothing
+                # on page N was known.
+                async for result in self.fetcher.stream_pages(job.url, job.known_ids, job.max_pages, job.backfill):
+                    modified = result.status != scraper.NOT_MODIFIED
+                    self._page_fetched(job, result.fetch_seconds, modified)
+                    if not modified:
+                        continue
+                    self._page_parsed(job, result.offers, result.failures, result.seconds)
+                    if result.status == scraper.PARSE_FAILURE:
+                        self._failed(job, result.status, f"no listing found in {job.url}")
+                        continue
+                    await self.dedup_queue.put((job, result.offers))
+            except Exception as e:
+                self._failed(job, getattr(e, "status", scraper.NETWORK_ERROR), e)
+            finally:
+                await self.dedup_queue.put((job, None))  # end of job
+                self.fetch_queue.task_done()
+
+    async def _dedup_worker(self):
+        while True:
+            job, offers = await self.dedup_queue.get()
+            try:
+                if offers is None:
+                    await self._finish(job)
+                else:
+                    await self._record(job, offers)
+            except Exception as e:
+                # Offers of a page that couldn't be recorded must be read
+                # again, so the cursor and page cache stay where they were
+                job.failed = True
+                print(f"Error in check logic: {e}")
+            finally:
+                if offers is None and not job.done.done():
+                    job.done.set_result(job.new_count)
+                self.dedup_queue.task_done()
+
+    async def _record(self, job, offers):
+        job.parsed += len(offers)
+        room = scraper.CURSOR_SIZE - len(job.newest)
+        if room > 0:
+            job.newest.extend([offer for offer in offers if not offer['promoted']][:room])
+
+        # Dedup is per subscriber: an offer is notified to every search whose
+        # rules it passes and that hasn't had it yet, so an offer rejected
+        # by one search (on this URL or another) still reaches the others.
+        # Offers the seen index has never had are new for everyone without
+        # asking the database; the rest are looked up in one query.
+        search_ids = [search['id'] for search, _ in job.subscribers]
+        candidates = list(dict.fromkeys(offer['id'] for offer in offers))
+        unknown = set()
+        if self.seen:
+            keys = {offer_id: seen_index.offer_key(offer_id) for offer_id in candidates}
+            unknown = {offer_id for offer_id in candidates if not self.seen.might_contain(keys[offer_id])}
+        lookup = [offer_id for offer_id in candidates if offer_id not in unknown]
+        delivered = await database.get_delivered(lookup, search_ids) if lookup else {}
+
+        new_offers = []      # not in the offers table yet
+        notified = []        # passed the rules of at least one search that hadn't had it
+        outbox_rows = []
+        deliveries = []
+        pending = set(candidates)
+        for offer in offers:
+            offer_id = offer['id']
+            if offer_id not in pending:
+                continue  # listed twice on the page
+            pending.discard(offer_id)
+            stored = offer_id in delivered
+            done = delivered.get(offer_id, set())
+            if stored and (done is None or len(done) == len(search_ids)):
+                continue
+            # Normalized salary and place are stored with the offer and
+            # used by the subscribers' rules
+            normalize.normalize_offer(offer, job.category)
+            if not stored:
+                new_offers.append(offer)
+            targets = [index for index in job.matcher.match(offer) if search_ids[index] not in done]
+            if targets:
+                notified.append(offer)
+            for index in targets:
+                search, channel = job.subscribers[index]
+                payload = {**offer, 'query': search['query']}
+                outbox_rows.append((offer_id, search['id'], channel.id, search['user_id'], json.dumps(payload)))
+                deliveries.append((search, channel, offer))
+        if not new_offers and not outbox_rows:
+            return
+
+        owner_id = search_ids[0]
+        offer_rows = [
+            (offer['id'], owner_id, offer['title'], offer['price'], offer['url'],
+             offer['salary_min'], offer['salary_max'], offer['salary_period'],
+             normalize.monthly(offer['salary_max'], offer['salary_period']),
+             offer['city'], offer['district'], offer['lat'], offer['lon'])
+            for offer in new_offers
+        ]
+        outbox_ids = await database.add_offers_with_outbox(offer_rows, outbox_rows)
+        # Queued before the next await, so the outbox worker never sees
+        # these rows pending without the dispatcher holding them
+        for outbox_id, (search, channel, offer) in zip(outbox_ids, deliveries):
+            if not self.dispatcher.submit_nowait(channel, search['user_id'], self.build_embed(search, offer), key=outbox_id):
+                self.outbox_wanted.set()
+        if self.seen and new_offers:
+            for offer in new_offers:
+                self.seen.add(keys[offer['id']])
+            await self._flush_seen()
+        job.new_count += len(notified)
+        metrics.count(job.url, new_offers=len(notified))
+
+    async def _flush_seen(self):
+        # Only the dedup worker writes offers, so every row up to the
+        # current max rowid is in the index at this point.
+        now = time.monotonic()
+        if now - self.seen_flushed < SEEN_FLUSH_SECONDS:
+            return
+        self.seen.flush(await database.max_offer_rowid())
+        self.seen_flushed = now
+
+    async def _finish(self, job):
+        interval = None
+        if self.on_checked:
+            interval = self.on_checked(job.url, job.new_count, job.failed)
+        # After a failed page the cursor stays where it was: moving it to the
+        # offers read so far would hide the ones on the pages that failed.
+        # The next check reads them again and dedup drops the repeats.
+        # The page cache entry goes too, or an unchanged page 1 would end the
+        # next check before it gets to them.
+        if job.failed:
+            cursor = job.cursor
+            self.fetcher.page_cache.pop(job.url, None)
+        else:
+            cursor = scraper.advance_cursor(job.cursor, job.newest)
+        await database.update_search_state([search['id'] for search, _ in job.subscribers], json.dumps(cursor), interval,
+                                           page=(job.url, self.fetcher.page_cache.get(job.url)))
+
+        if job.new_count > 0:
+            ids = ", ".join(str(search['id']) for search, _ in job.subscribers)
+            print(f"Queued {job.new_count} offers for search {ids}")
@@ -0,0 +1,154 @@
+import functools
+import json
+import re
+
+import normalize
+
+# Per-search rules, stored as JSON in searches.rules:
+#   {"include": ["python", "junior"],   # title must contain one of these
+#    "exclude": ["senior"],             # title must contain none of these
+#    "min_salary": 5000,                # upper end of the monthly pay >= this
+#    "max_salary": 12000,               # lower end of the monthly pay <= this
+#    "contract": ["umowa o pracę"],     # parsed contract contains one of these
+#    "near": "Kraków", "radius_km": 30} # offer located within the radius
+# Missing keys don't restrict anything. Offers that don't state a salary
+# pass the salary rules, since most OLX job ads leave it out, and offers
+# from towns missing in the city table pass the radius rule.
+def _words(text):
+    # "Python, Django" -> ["python", "django"]
+    if not text:
+        return []
+    if isinstance(text, str):
+        text = text.split(",")
+    return list(dict.fromkeys(w.strip().casefold() for w in text if w.strip()))
+
+def from_options(include=None, exclude=None, min_salary=None, max_salary=None, contract=None, near=None, radius_km=None):
+    # Rules dict from /findjob options; empty options are left out
+    rules = {
+        "include": _words(include),
+        "exclude": _words(exclude),
+        "min_salary": min_salary,
+        "max_salary": max_salary,
+        "contract": _words(contract),
+        "near": near if radius_km else None,
+        "radius_km": radius_km,
+    }
+    return {key: value for key, value in rules.items() if value}
+
+def load(rules_json):
+    if not rules_json:
+        return {}
+    try:
+        rules = json.loads(rules_json)
+    except json.JSONDecodeError:
+        return {}
+    return rules if isinstance(rules, dict) else {}
+
+def describe(rules):
+    parts = []
+    if rules.get("include"):
+        parts.append("+" + ", +".join(rules["include"]))
+    if rules.get("exclude"):
+        parts.append("-" + ", -".join(rules["exclude"]))
+    if rules.get("min_salary"):
+        parts.append(f"≥ {rules['min_salary']} zł")
+    if rules.get("max_salary"):
+        parts.append(f"≤ {rules['max_salary']} zł")
+    if rules.get("contract"):
+        parts.append("umowa: " + " / ".join(rules["contract"]))
+    if rules.get("near") and rules.get("radius_km"):
+        parts.append(f"≤ {rules['radius_km']} km od {rules['near']}")
+    return " | ".join(parts)
+
+def _is_word_char(c):
+    return c.isalnum() or c == "_"
+
+class Matcher:
+    """Evaluates the rules of every subscriber of a URL against an offer.
+
+    All keywords of all rules are compiled into one regex, so a title is
+    scanned once however many searches share the URL. Each match also
+    counts for the shorter keywords it starts with ("java" inside a
+    "java developer" match). Salaries and places come from the fields added
+    by normalize.normalize_offer."""
+    def __init__(self, rules_list):
+        self.rules = []
+        for rules in rules_list:
+            self.rules.append({
+                "include": frozenset(_words(rules.get("include"))),
+                "exclude": frozenset(_words(rules.get("exclude"))),
+                "min_salary": rules.get("min_salary"),
+                "max_salary": rules.get("max_salary"),
+                "contract": _words(rules.get("contract")),
+                "center": self._center(rules),
+            })
+        self.unrestricted = not any(any(rule.values()) for rule in self.rules)
+
+        keywords = set()
+        for rule in self.rules:
+            keywords |= rule["include"] | rule["exclude"]
+        self.pattern = None
+        self.implied = {}
+        if keywords:
+            # Longest first so the regex prefers "java developer" over "java";
+            # the lookahead finds matches starting at every position.
+            ordered = sorted(keywords, key=len, reverse=True)
+            self.pattern = re.compile(r"(?=(?<!\w)(" + "|".join(map(re.escape, ordered)) + r")(?!\w))")
+            for keyword in keywords:
+                self.implied[keyword] = frozenset(
+                    other for other in keywords
+                    if keyword.startswith(other) and (len(keyword) == len(other) or not _is_word_char(keyword[len(other)]))
+                )
+
+    @staticmethod
+    def _center(rules):
+        # (lat, lon, radius_km) for a radius rule whose town is in the city table
+        if not rules.get("near") or not rules.get("radius_km"):
+            return None
+        place = normalize.resolve_location(rules["near"])
+        if not place or place[2] is None:
+            return None
+        return place[2], place[3], rules["radius_km"]
+
+    def match(self, offer):
+        # Indexes (into rules_list) of the rules the offer passes
+        if self.unrestricted:
+            return list(range(len(self.rules)))
+
+        found = set()
+        if self.pattern:
+            for m in self.pattern.finditer(offer.get("title", "").casefold()):
+                found |= self.implied[m.group(1)]
+        salary = None
+        if offer.get("salary_min") is not None:
+            salary = (normalize.monthly(offer["salary_min"], offer["salary_period"]),
+                      normalize.monthly(offer["salary_max"], offer["salary_period"]))
+        contract = None
+
+        accepted = []
+        for index, rule in enumerate(self.rules):
+            if rule["include"] and found.isdisjoint(rule["include"]):
+                continue
+            if rule["exclude"] and not found.isdisjoint(rule["exclude"]):
+                continue
+            if salary:
+                if rule["min_salary"] and salary[1] < rule["min_salary"]:
+                    continue
+                if rule["max_salary"] and salary[0] > rule["max_salary"]:
+                    continue
+            if rule["contract"]:
+                if contract is None:
+                    contract = (offer.get("contract") or "").casefold()
+                if not any(c in contract for c in rule["contract"]):
+                    continue
+            if rule["center"] and offer.get("lat") is not None:
+                lat, lon, radius_km = rule["center"]
+                if normalize.distance_km(lat, lon, offer["lat"], offer["lon"]) > radius_km:
+                    continue
+            accepted.append(index)
+        return accepted
+
+@functools.lru_cache(maxsize=256)
+def matcher_for(rules_jsons):
+    # Compiled once per combination of subscriber rules (a tuple of JSON strings)
+    return Matcher([load(rules_json) for rules_json in rules_jsons])
@@ -0,0 +1,93 @@
+import heapq
+import random
+import time
+
+# Polling intervals in seconds
+DEFAULT_INTERVAL = 600    # the old fixed bg_task period
+MIN_INTERVAL = 120
+MAX_INTERVAL = 3600
+JITTER = 0.1              # +/- fraction applied to every interval
+SPEEDUP = 0.5             # interval multiplier after a check that found new offers
+SLOWDOWN = 1.25           # interval multiplier after a check that found nothing
+STARTUP_SPREAD = 300      # overdue searches at startup are spread over this window
+TICK_SECONDS = 15         # how often the bot looks for due searches
+
+def clamp(interval):
+    return max(MIN_INTERVAL, min(MAX_INTERVAL, interval))
+
+def jittered(interval):
+    return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+class Scheduler:
+    """Priority queue of search keys ordered by next-due time.
+
+    Each key has its own interval that shrinks when a check finds new
+    offers and grows when it doesn't, bounded by MIN/MAX_INTERVAL.
+    Removed or rescheduled keys leave stale heap entries behind; they are
+    skipped on pop by comparing sequence numbers."""
+    def __init__(self):
+        self.heap = []
+        self.entries = {}  # key -> {"due", "interval", "seq"}
+        self.seq = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _push(self, key, due, interval):
+        self.seq += 1
+        self.entries[key] = {"due": due, "interval": interval, "seq": self.seq}
+        heapq.heappush(self.heap, (due, self.seq, key))
+
+    def add(self, key, interval=None, last_checked=None, now=None):
+        # last_checked (epoch seconds) lets a restart pick up the old
+        # schedule. Keys that are already overdue, or were never checked,
+        # are spread over STARTUP_SPREAD instead of all firing at once.
+        now = time.time() if now is None else now
+        interval = clamp(interval or DEFAULT_INTERVAL)
+        due = last_checked + interval if last_checked is not None else now
+        if due <= now:
+            due = now + random.uniform(0, min(interval, STARTUP_SPREAD))
+        self._push(key, due, interval)
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+
+    def sync(self, states, now=None):
+        # states: key -> (interval, last_checked). Adds new keys and drops
+        # keys that are gone; existing keys keep their in-memory schedule.
+        for key in list(self.entries):
+            if key not in states:
+                self.remove(key)
+        for key, (interval, last_checked) in states.items():
+            if key not in self.entries:
+                self.add(key, interval, last_checked, now)
+
+    def pop_due(self, now=None):
+        # Returns every key whose due time has passed. Popped keys stay
+        # registered and must be put back with reschedule().
+        now = time.time() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self.heap)
+            entry = self.entries.get(key)
+            if entry and entry["seq"] == seq:
+                due.append(key)
+        return due
+
+    def reschedule(self, key, new_offers, now=None, failed=False):
+        # Adapts the interval to the observed rate of new offers and
+        # returns it (without jitter) so it can be persisted. A failed check
+        # says nothing about that rate: the interval stays as it is and the
+        # key is retried after at most MIN_INTERVAL.
+        now = time.time() if now is None else now
+        entry = self.entries.get(key)
+        interval = entry["interval"] if entry else DEFAULT_INTERVAL
+        if failed:
+            self._push(key, now + jittered(min(interval, MIN_INTERVAL)), interval)
+            return interval
+        interval = clamp(interval * (SPEEDUP if new_offers else SLOWDOWN))
+        self._push(key, now + jittered(interval), interval)
+        return interval
@@ -1,7 +1,68 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
 
-def build_olx_url(city, query, category="praca", filters=None):
+import aiohttp
+
+# requests, BeautifulSoup and lxml are imported on first use: the bot only
+# needs them for the blocking helpers and the HTML fallback parsers, and
+# importing them up front slows down startup and every spawned worker.
+
+try:
+    import brotli  # lets aiohttp decode "br" responses
+except ImportError:
+    brotli = None
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+ASYNC_HEADERS = {
+    **HEADERS,
+    "Accept-Encoding": "gzip, deflate, br" if brotli else "gzip, deflate",
+}
+
+# Fetch engine defaults
+MAX_CONCURRENCY = 8       # pages downloaded at the same time
+HOST_INTERVAL = 0.25      # min seconds between two requests to the same host
+PARSE_WORKERS = 2         # processes used for HTML parsing
+
+# Incremental scraping
+MAX_PAGES = 5             # pages followed per sweep while every card is still new
+CURSOR_SIZE = 10          # newest offer ids remembered per search
+
+# Failure handling
+CONNECT_TIMEOUT = 10      # seconds to establish a connection
+READ_TIMEOUT = 30         # seconds without data before a response is abandoned
+RETRIES = 3               # extra attempts after a 429, 5xx or network error
+RETRY_BASE = 1.0          # backoff ceiling for the first retry, doubled each time (full jitter)
+RETRY_MAX = 30.0
+BREAKER_THRESHOLD = 5     # consecutive failed requests that open the circuit breaker
+BREAKER_COOLDOWN = 60.0   # seconds all traffic pauses; doubled while the site keeps failing
+BREAKER_MAX_COOLDOWN = 900.0
+
+# Streaming (Fetcher.stream_offers / Fetcher.sweep)
+SWEEP_CATEGORIES = ("praca", "nieruchomosci", "motoryzacja")
+SWEEP_BUFFER = 100        # offers buffered between a sweep's fetchers and its consumer
+
+# Parser backend: "auto" (embedded JSON, then lxml, then bs4), "lxml" or "bs4"
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "auto")
+
+# Distances (km) OLX accepts for search[dist], the area around the city
+OLX_DISTANCES = (2, 5, 10, 15, 30, 50, 75, 100)
+
+def olx_distance(radius_km):
+    # Smallest OLX distance covering radius_km, or None beyond the largest
+    return next((distance for distance in OLX_DISTANCES if distance >= radius_km), None)
+
+def build_olx_url(city, query, category="praca", filters=None, distance=None):
     # OLX URL structure: https://www.olx.pl/{category}/{city}/q-{query}/
     # Simple sanitization
     city = city.lower().replace(" ", "-")
@@ -24,6 +85,8 @@ def build_olx_url(city, query, category="praca", filters=None):
         
         if params:
             url += "?" + "&".join(params)
+    if distance:
+        url += ("&" if "?" in url else "?") + f"search[dist]={distance}"
     if url[-1]=="/":
         url+="?"
     else:
@@ -32,97 +95,696 @@ def build_olx_url(city, query, category="praca", filters=None):
     
     return url
 
-def fetch_offers(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+_INDEXED_PARAM = re.compile(r"^(.*)\[\d+\]$")
+
+def canonical_url(url):
+    # Normalizes a search URL so that equivalent searches compare equal:
+    # lowercase host, no duplicate slashes, sorted query parameters and
+    # multi-value filters (search[filter_enum_x][0..n]) sorted and re-indexed.
+    parts = urlsplit(url)
+    path = quote(unquote(re.sub(r"/{2,}", "/", parts.path))) or "/"
+
+    plain = []
+    indexed = {}
+    for key, value in parse_qsl(parts.query, keep_blank_values=True):
+        match = _INDEXED_PARAM.match(key)
+        if match:
+            indexed.setdefault(match.group(1), set()).add(value)
+        else:
+            plain.append((key, value))
+
+    for key, values in indexed.items():
+        for i, value in enumerate(sorted(values)):
+            plain.append((f"{key}[{i}]", value))
+    plain.sort()
+
+    query = urlencode(plain, safe=":")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+def category_urls(city, query, categories=SWEEP_CATEGORIES):
+    # The same search in several categories, for Fetcher.sweep
+    return [build_olx_url(city, query, category) for category in categories]
+
+def page_url(url, page):
+    # OLX paginates with a plain ?page=N parameter; page 1 is the bare URL
+    if page <= 1:
+        return url
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "page"]
+    query.append(("page", str(page)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query, safe=":"), ""))
+
+def advance_cursor(cursor, offers):
+    # New cursor = ids of the newest regular (non-promoted) offers, topped up
+    # with the previous cursor. Promoted ads are pinned to the top regardless
+    # of date, so they can't mark how far we have read.
+    newest = [offer['id'] for offer in offers if not offer.get('promoted')]
+    merged = list(dict.fromkeys(newest + list(cursor or [])))
+    return merged[:CURSOR_SIZE]
+
+def wants_next_page(offers, reached_known, known_ids, backfill=False):
+    # Pagination is followed while a page had offers and none of them was
+    # known. Without known ids (new search) we can't tell a burst from the
+    # backlog, so only page 1 is read, unless a backfill was asked for.
+    return bool(offers) and not reached_known and (bool(known_ids) or backfill)
+
+def parse_offers(html):
+    return parse_offers_until(html)[0]
+
+def parse_offers_until(html, known_ids=(), backend=None, errors=None):
+    # Parses cards newest-first and stops at the first regular card whose id
+    # is in known_ids. Returns (offers, reached_known). Backends yield cards
+    # lazily, so stopping early also skips the work for the remaining cards.
+    # Cards that fail to parse are skipped and, if given, added to errors.
+    offers = []
+    for offer in iter_offers(html, backend, errors):
+        if not offer['promoted'] and offer['id'] in known_ids:
+            return offers, True
+        offers.append(offer)
+    return offers, False
+
+# Page outcomes (PageResult.status)
+OK = "ok"                        # offers found
+EMPTY = "empty"                  # the listing is there but has no offers
+PARSE_FAILURE = "parse_failure"  # no listing at all: OLX changed its layout
+NETWORK_ERROR = "network_error"  # timeouts, connection errors, 5xx after retries
+BLOCKED = "blocked"              # 403/429 after retries, or the circuit breaker is open
+NOT_MODIFIED = "not_modified"    # page 1 is unchanged since the last check (304 or same listing hash)
+
+# Markers of a listing that really has nothing in it. A page state script
+# alone isn't one: captcha and error pages have it too.
+_EMPTY_MARKERS = ('data-testid="listing-grid"', 'Nie znaleźliśmy ogłoszeń')
+
+class PageResult:
+    """Outcome of one listing page, so an empty page, a page the parser no
+    longer understands and a failed request can't be mistaken for each
+    other. seconds is the parse time, fetch_seconds the download time when
+    the page came from Fetcher.stream_pages."""
+    __slots__ = ("status", "offers", "reached_known", "failures", "seconds", "error", "fetch_seconds")
+
+    def __init__(self, status, offers=(), reached_known=False, failures=0, seconds=0.0, error=None, fetch_seconds=0.0):
+        self.status = status
+        self.offers = list(offers)
+        self.reached_known = reached_known
+        self.failures = failures
+        self.seconds = seconds
+        self.error = error
+        self.fetch_seconds = fetch_seconds
+
+    def __repr__(self):
+        return f"PageResult({self.status}, {len(self.offers)} offers)"
+
+def parse_page(html, known_ids=()):
+    # Pipeline entry point, run in the parse process pool. The result also
+    # carries the number of cards that failed to parse and the parse time,
+    # which can't be observed from the event loop side.
+    start = time.perf_counter()
+    errors = []
+    offers, reached_known = parse_offers_until(html, known_ids, errors=errors)
+    if offers or reached_known:
+        status = OK
+    elif any(marker in html for marker in _EMPTY_MARKERS) or extract_embedded_ads(html) == []:
+        status = EMPTY
+    else:
+        status = PARSE_FAILURE
+    return PageResult(status, offers, reached_known, len(errors), time.perf_counter() - start)
+
+@functools.lru_cache(maxsize=None)
+def lxml_html():
+    # lxml.html module, or None when lxml isn't installed
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        offers = []
-        
-        # This selector needs to be verified against live OLX
-        # Looking for listing grid. 
-        # Usually offers are in div with data-cy="l-card" or similar.
-        
-        # Trying a generic approach for listings
-        # NOTE: This is a best-guess and will likely need refinement after testing structure.
-        listing_grid = soup.find('div', {'data-testid': 'listing-grid'})
+        from lxml import html
+    except ImportError:
+        return None
+    return html
+
+def iter_offers(html, backend=None, errors=None):
+    # "auto" reads the listing straight from the state OLX embeds in the page
+    # and falls back to HTML scraping (lxml if installed, else BeautifulSoup)
+    # when it's missing. "lxml" and "bs4" force an HTML backend.
+    backend = backend or PARSER_BACKEND
+    if backend == "auto":
+        ads = extract_embedded_ads(html)
+        if ads is not None:
+            return _offers_from_ads(ads, errors)
+    if backend in ("auto", "lxml") and lxml_html() is not None:
+        return _offers_lxml(html, errors)
+    return _offers_bs4(html, errors)
+
+OFFER_FIELDS = (
+    'id', 'title', 'price', 'location', 'contract', 'work_load', 'url', 'promoted', 'lat', 'lon',
+    # filled in by normalize.normalize_offer
+    'salary_min', 'salary_max', 'salary_period', 'city', 'district',
+)
+
+class Offer:
+    """One listing card.
+
+    A slotted record instead of a dict: a deep crawl creates a lot of them
+    and they are pickled between processes. Item access (offer['id'],
+    offer.get(), {**offer}) works as it did for the dicts it replaces."""
+    __slots__ = OFFER_FIELDS
+
+    def __init__(self, **fields):
+        for name in OFFER_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    def __getitem__(self, name):
+        if name not in OFFER_FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in OFFER_FIELDS:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in OFFER_FIELDS
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in OFFER_FIELDS else default
+
+    def keys(self):
+        return OFFER_FIELDS
+
+    def __repr__(self):
+        return f"Offer({self.id!r})"
+
+def make_offer(title, link, details, promoted):
+    if link.startswith('/'):
+        link = "https://www.olx.pl" + link
+    # ID extraction
+    offer_id = link
+    return Offer(
+        id=offer_id,
+        title=title,
+        price=details.get("price") or "N/A",
+        location=details.get("location") or "N/A",
+        contract=details.get("contract") or "N/A",
+        work_load=details.get("work_load") or "N/A",
+        lat=details.get("lat"),
+        lon=details.get("lon"),
+        url=link,
+        promoted=promoted,
+    )
+
+def classify_detail(details, text):
+    # Naive classification based on keywords
+    if "zł" in text:
+        details["price"] = text
+    elif any(x in text for x in ["Umowa", "B2B", "Kontrakt", "Samozatrudnienie"]):
+        details["contract"] = text
+    elif "etat" in text or "Praca" in text: # Praca dodatkowa / Pełny etat
+        details["work_load"] = text
+    elif not details.get("location") and ("," in text or (text[0].isupper() and len(text) < 40 and "dzisiaj" not in text.lower())):
+        # Location heuristic: "Kraków, Stare Miasto"
+        details["location"] = text
+
+# --- Embedded state backend ---
+
+_PRERENDERED_STATE = re.compile(r'window\.__PRERENDERED_STATE__\s*=\s*("(?:[^"\\]|\\.)*")', re.S)
+_NEXT_DATA = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+
+def extract_embedded_state(html):
+    # OLX ships the page state as JSON for hydration, either as a JSON-encoded
+    # string in window.__PRERENDERED_STATE__ or in a __NEXT_DATA__ script.
+    # Returns the decoded state, or None if absent.
+    try:
+        match = _PRERENDERED_STATE.search(html)
+        if match:
+            return json.loads(json.loads(match.group(1)))
+        match = _NEXT_DATA.search(html)
+        if match:
+            return json.loads(match.group(1))
+    except ValueError:
+        pass
+    return None
+
+def extract_embedded_ads(html):
+    # The list of ads from the embedded state, or None if absent
+    state = extract_embedded_state(html)
+    if state is None:
+        return None
+    return _find_ads(state)
+
+def _find_ads(state):
+    # The exact path (listing -> listing -> ads) has moved between releases,
+    # so look for the first "ads" list of ad objects anywhere in the state.
+    stack = [state]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ads = node.get("ads")
+            if isinstance(ads, list) and (not ads or (isinstance(ads[0], dict) and "url" in ads[0])):
+                return ads
+            stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(v for v in node if isinstance(v, (dict, list)))
+    return None
+
+def _offers_from_ads(ads, errors=None):
+    for ad in ads:
+        try:
+            title = (ad.get('title') or "").strip()
+            link = ad.get('url')
+            if not title or not link: continue
+
+            params = {p.get('key'): p for p in ad.get('params') or [] if isinstance(p, dict)}
+            location = ad.get('location') or {}
+            coords = ad.get('map') or {}
+            details = {
+                "price": (ad.get('price') or {}).get('displayValue') or params.get('salary', {}).get('value'),
+                "location": ", ".join(x for x in (location.get('cityName'), location.get('districtName')) if x),
+                "contract": params.get('agreement', {}).get('value'),
+                "work_load": params.get('type', {}).get('value'),
+                "lat": coords.get('lat'),
+                "lon": coords.get('lon'),
+            }
+            yield make_offer(title, link, details, bool(ad.get('isPromoted')))
+        except Exception as e:
+            print(f"Error parsing card: {e}")
+            if errors is not None:
+                errors.append(e)
+            continue
+
+# --- HTML backends ---
+
+def _offers_lxml(html, errors=None):
+    # Same SVG-proximity heuristics as _offers_bs4, evaluated by libxml2
+    root = lxml_html().fromstring(html)
+    grid = root.xpath('//div[@data-testid="listing-grid"]')
+    if not grid:
+        return
+
+    for card in grid[0].xpath('.//div[@data-cy="l-card"]'):
+        try:
+            title_tags = card.xpath('(.//h4)[1]') or card.xpath('(.//h6)[1]')
+            if not title_tags: continue
+            title = title_tags[0].text_content().strip()
+
+            link_tags = card.xpath('(.//a[@href])[1]')
+            if not link_tags: continue
+            link = link_tags[0].get('href')
+
+            details = {}
+            for p in card.xpath('.//div[.//svg]/descendant::p[1]'):
+                text = "".join(t.strip() for t in p.itertext())
+                if not text: continue
+                classify_detail(details, text)
+
+            promoted = bool(card.xpath('.//*[@data-testid="adCard-featured"]'))
+            yield make_offer(title, link, details, promoted)
+        except Exception as e:
+            print(f"Error parsing card: {e}")
+            if errors is not None:
+                errors.append(e)
+            continue
+
+def _offers_bs4(html, errors=None):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # This selector needs to be verified against live OLX
+    # Looking for listing grid. 
+    # Usually offers are in div with data-cy="l-card" or similar.
+    
+    # Trying a generic approach for listings
+    # NOTE: This is a best-guess and will likely need refinement after testing structure.
+    listing_grid = soup.find('div', {'data-testid': 'listing-grid'})
+    
+    if not listing_grid:
+        # Fallback or empty
+        return
         
-        if not listing_grid:
-            # Fallback or empty
-            return []
+    cards = listing_grid.find_all('div', {'data-cy': 'l-card'})
+    
+    for card in cards:
+        try:
+            title_tag = card.find('h4')
+            if not title_tag: 
+                 # Fallback to h6 just in case
+                 title_tag = card.find('h6')
+            if not title_tag: continue
+            title = title_tag.text.strip()
             
-        cards = listing_grid.find_all('div', {'data-cy': 'l-card'})
-        
-        for card in cards:
+            link_tag = card.find('a', href=True)
+            if not link_tag: continue
+            link = link_tag['href']
+            
+            # New extraction logic based on SVG proximity
+            details = {}
+            
+            # Find all potential detail items.
+            # Structure: A container div holding an SVG (icon) and a P tag (text).
+            # We iterate all divs in the card.
+            for div in card.find_all('div'):
+                if div.find('svg') and div.find('p'):
+                     text = div.find('p').get_text(strip=True)
+                     if not text: continue
+                     classify_detail(details, text)
+            
+            promoted = card.find(attrs={'data-testid': 'adCard-featured'}) is not None
+            yield make_offer(title, link, details, promoted)
+        except Exception as e:
+            print(f"Error parsing card: {e}")
+            if errors is not None:
+                errors.append(e)
+            continue
+
+class FetchError(Exception):
+    status = NETWORK_ERROR
+
+class BlockedError(FetchError):
+    # OLX refused or throttled us, or the circuit breaker is open
+    status = BLOCKED
+
+class LayoutError(FetchError):
+    # The page came back but holds no listing the parser recognises
+    status = PARSE_FAILURE
+
+def _retry_delay(attempt, retry_after=None):
+    # Full jitter: a random wait up to the exponential ceiling, so workers
+    # that failed together don't retry together. Retry-After is a minimum.
+    delay = random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+def _retry_after(headers):
+    try:
+        return min(float(headers.get("Retry-After")), BREAKER_MAX_COOLDOWN)
+    except (TypeError, ValueError):
+        return None
+
+def _status_error(status):
+    # Error for a status worth retrying, or None
+    if status in (403, 429):
+        return BlockedError(f"HTTP {status}")
+    if status >= 500:
+        return FetchError(f"HTTP {status}")
+    return None
+
+def fetch_page(url):
+    # Blocking variant, kept for scripts. The bot uses Fetcher instead.
+    # Returns a PageResult; failures are in its status, never an empty list.
+    import requests
+    for attempt in range(RETRIES + 1):
+        retry_after = None
+        try:
+            response = requests.get(url, headers=HEADERS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            error = _status_error(response.status_code)
+            retry_after = _retry_after(response.headers)
+        except requests.RequestException as e:
+            error = FetchError(f"{type(e).__name__}: {e}")
+        if error is None:
+            break
+        if attempt == RETRIES:
+            return PageResult(error.status, error=str(error))
+        time.sleep(_retry_delay(attempt, retry_after))
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        return PageResult(NETWORK_ERROR, error=str(e))
+    return parse_page(response.text)
+
+def fetch_offers(url):
+    # Offers on one page. Raises FetchError (or a subclass matching the
+    # failure) instead of returning [], so an outage or a layout change
+    # doesn't look like a quiet day.
+    result = fetch_page(url)
+    errors = {NETWORK_ERROR: FetchError, BLOCKED: BlockedError, PARSE_FAILURE: LayoutError}
+    if result.status in errors:
+        raise errors[result.status](result.error or f"No listing found in {url}")
+    return result.offers
+
+def listing_fingerprint(html):
+    # Hash of the part of the page that holds the listing. The rest of the
+    # page (nonces, tracking ids, timestamps) changes on every request, so a
+    # whole-body hash would never match.
+    start = html.find('data-testid="listing-grid"')
+    if start != -1:
+        end = len(html)
+        for marker in ('data-testid="pagination', '</main>'):
+            found = html.find(marker, start)
+            if found != -1:
+                end = min(end, found)
+        listing = html[start:end]
+    else:
+        match = _PRERENDERED_STATE.search(html) or _NEXT_DATA.search(html)
+        listing = match.group(1) if match else html
+    return hashlib.blake2b(listing.encode("utf-8"), digest_size=16).hexdigest()
+
+class HostRateLimiter:
+    """Spaces out requests to the same host by at least `interval` seconds."""
+    def __init__(self, interval=HOST_INTERVAL):
+        self.interval = interval
+        self.next_slot = {}
+
+    async def wait(self, host):
+        # Reserve the next free slot for this host, then sleep until it comes.
+        # Reserving first means concurrent callers queue up instead of all
+        # firing at once after the same sleep.
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class CircuitBreaker:
+    """Stops all requests for a while once OLX keeps failing or throttling.
+
+    closed: requests go through, consecutive failures are counted.
+    open: check() raises BlockedError until the cooldown is over.
+    half-open: one probe request is let through; success closes the
+    breaker, failure opens it again with twice the cooldown. check()
+    returns True for the probe, whose caller must release() it however
+    the request ends."""
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self.probing = False
+        self.state = "closed"
+
+    def check(self):
+        if self.state == "closed":
+            return False
+        now = time.monotonic()
+        if self.state == "open" and now >= self.opened_until:
+            self.state = "half-open"
+            self.probing = False
+        if self.state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        raise BlockedError(f"Circuit breaker open for another {max(0, self.opened_until - now):.0f}s")
+
+    def success(self):
+        if self.state != "closed":
+            print("Circuit breaker closed")
+        self.state = "closed"
+        self.failures = 0
+        self.probing = False
+        self.cooldown = self.base_cooldown
+
+    def failure(self, retry_after=None):
+        self.failures += 1
+        if self.state == "half-open":
+            self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+            self.open(retry_after)
+        elif self.state == "closed" and self.failures >= self.threshold:
+            self.open(retry_after)
+
+    def release(self):
+        # A probe that ended without success() or failure() (cancelled, or
+        # an error that says nothing about the site) lets the next one through
+        if self.state == "half-open":
+            self.probing = False
+
+    def open(self, retry_after=None):
+        pause = max(self.cooldown, retry_after or 0)
+        self.state = "open"
+        self.probing = False
+        self.opened_until = time.monotonic() + pause
+        print(f"Circuit breaker open: pausing requests for {pause:.0f}s after {self.failures} failures")
+
+class Fetcher:
+    """Async fetch engine: one pooled keep-alive session, a concurrency
+    limit, per-host rate limiting, conditional requests and parsing in a
+    process pool. Requests time out, are retried with jittered backoff on
+    429/5xx/network errors and go through a circuit breaker, so an outage
+    makes a sweep fail fast instead of hanging."""
+    def __init__(self, concurrency=MAX_CONCURRENCY, host_interval=HOST_INTERVAL, parse_workers=PARSE_WORKERS):
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(host_interval)
+        self.breaker = CircuitBreaker()
+        self.parse_workers = parse_workers
+        self.session = None
+        self.executor = None
+        self.semaphore = None
+        # url -> {"etag", "last_modified", "hash"} from the last full response
+        self.page_cache = {}
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, headers=ASYNC_HEADERS, timeout=timeout)
+        # parse_workers=0 parses on the loop's default thread pool instead,
+        # for processes that are themselves workers (see workers.py)
+        if self.parse_workers:
+            # Not fork: the bot is multi-threaded by now (aiosqlite, the
+            # loop's executor) and forking it can deadlock the children
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self.executor = ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=multiprocessing.get_context(method))
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def fetch_html(self, url, conditional=False):
+        # With conditional=True, sends the stored validators and returns None
+        # when the server answers 304 or the listing hashes the same as last
+        # time, so the caller can skip parsing entirely.
+        cached = self.page_cache.get(url) if conditional else None
+        headers = {}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        for attempt in range(RETRIES + 1):
+            probe = self.breaker.check()
+            retry_after = None
             try:
-                title_tag = card.find('h4')
-                if not title_tag: 
-                     # Fallback to h6 just in case
-                     title_tag = card.find('h6')
-                if not title_tag: continue
-                title = title_tag.text.strip()
-                
-                link_tag = card.find('a', href=True)
-                if not link_tag: continue
-                link = link_tag['href']
-                if link.startswith('/'):
-                    link = "https://www.olx.pl" + link
-                
-                # New extraction logic based on SVG proximity
-                details = {
-                    "price": None,
-                    "location": None,
-                    "contract": None,
-                    "work_load": None
-                }
-                
-                # Find all potential detail items.
-                # Structure: A container div holding an SVG (icon) and a P tag (text).
-                # We iterate all divs in the card.
-                for div in card.find_all('div'):
-                    if div.find('svg') and div.find('p'):
-                         text = div.find('p').get_text(strip=True)
-                         if not text: continue
-                         
-                         # Naive classification based on keywords
-                         if "zł" in text:
-                             details["price"] = text
-                         elif any(x in text for x in ["Umowa", "B2B", "Kontrakt", "Samozatrudnienie"]):
-                             details["contract"] = text
-                         elif "etat" in text or "Praca" in text: # Praca dodatkowa / Pełny etat
-                             details["work_load"] = text
-                         elif not details["location"] and ("," in text or (text[0].isupper() and len(text) < 40 and "dzisiaj" not in text.lower())):
-                             # Location heuristic: "Kraków, Stare Miasto"
-                             details["location"] = text
-                
-                # Cleanup / Fallbacks
-                price = details["price"] if details["price"] else "N/A"
-                location = details["location"] if details["location"] else "N/A"
-                contract = details["contract"] if details["contract"] else "N/A"
-                work_load = details["work_load"] if details["work_load"] else "N/A"
-                
-                # ID extraction
-                offer_id = link
-                
-                offers.append({
-                    'id': offer_id,
-                    'title': title,
-                    'price': price,
-                    'location': location,
-                    'contract': contract,
-                    'work_load': work_load,
-                    'url': link
-                })
+                try:
+                    async with self.semaphore:
+                        await self.limiter.wait(urlsplit(url).netloc)
+                        async with self.session.get(url, headers=headers) as response:
+                            error = _status_error(response.status)
+                            if error is None:
+                                if response.status == 304:
+                                    self.breaker.success()
+                                    return None
+                                response.raise_for_status()  # other 4xx: not retried
+                                html = await response.text()
+                                etag = response.headers.get("ETag")
+                                last_modified = response.headers.get("Last-Modified")
+                            else:
+                                retry_after = _retry_after(response.headers)
+                except aiohttp.ClientResponseError:
+                    self.breaker.success()  # the site answered; the URL is the problem
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = FetchError(f"{type(e).__name__}: {e}")
+                if error is None:
+                    self.breaker.success()
+                    break
+                self.breaker.failure(retry_after)
+            finally:
+                if probe:
+                    self.breaker.release()
+            if attempt == RETRIES or self.breaker.state == "open":
+                raise error
+            await asyncio.sleep(_retry_delay(attempt, retry_after))
+
+        if not conditional:
+            return html
+        fingerprint = listing_fingerprint(html)
+        self.page_cache[url] = {"etag": etag, "last_modified": last_modified, "hash": fingerprint}
+        if cached and cached["hash"] == fingerprint:
+            return None
+        return html
+
+    async def _timed_fetch(self, url, conditional):
+        start = time.perf_counter()
+        html = await self.fetch_html(url, conditional=conditional)
+        return html, time.perf_counter() - start
+
+    async def stream_pages(self, url, known_ids=(), max_pages=MAX_PAGES, backfill=False, conditional=True):
+        # Yields a PageResult per page, newest first. Pagination is followed
+        # as wants_next_page() decides; the next page is fetched while the
+        # caller handles the current one, and no more than that is held, so
+        # memory stays flat however deep the crawl goes. An unchanged page 1
+        # (conditional=True) yields NOT_MODIFIED and a page without a
+        # listing yields PARSE_FAILURE, and either ends the stream. Fetch
+        # errors are raised.
+        known_ids = frozenset(known_ids or ())
+        loop = asyncio.get_running_loop()
+        pending = asyncio.ensure_future(self._timed_fetch(page_url(url, 1), conditional))
+        try:
+            for page in range(1, max_pages + 1):
+                html, fetch_seconds = await pending
+                pending = None
+                if html is None:
+                    yield PageResult(NOT_MODIFIED, fetch_seconds=fetch_seconds)
+                    return
+                result = await loop.run_in_executor(self.executor, parse_page, html, known_ids)
+                del html
+                result.fetch_seconds = fetch_seconds
+                more = (result.status != PARSE_FAILURE and page < max_pages
+                        and wants_next_page(result.offers, result.reached_known, known_ids, backfill))
+                if more:
+                    # Only page 1 is cached: if it hasn't changed, nothing is new
+                    pending = asyncio.ensure_future(self._timed_fetch(page_url(url, page + 1), False))
+                yield result
+                if not more:
+                    return
+        finally:
+            if pending:
+                pending.cancel()
+                if pending.done() and not pending.cancelled():
+                    pending.exception()  # read, so it isn't reported as unhandled
+
+    async def stream_offers(self, url, known_ids=(), max_pages=MAX_PAGES, conditional=False):
+        # Offers alone, until max_pages, an empty page or a known offer.
+        # A page without a listing raises LayoutError.
+        pages = self.stream_pages(url, known_ids, max_pages, backfill=True, conditional=conditional)
+        try:
+            async for result in pages:
+                if result.status == PARSE_FAILURE:
+                    raise LayoutError(f"No listing found in {url}")
+                for offer in result.offers:
+                    yield offer
+        finally:
+            await pages.aclose()
+
+    async def sweep(self, urls, known_ids=(), max_pages=MAX_PAGES, buffer=SWEEP_BUFFER):
+        # Streams several URLs at once (e.g. category_urls()) and yields
+        # (url, offer) in arrival order. Fetchers block once `buffer` offers
+        # are waiting, so a slow consumer holds the crawl back instead of
+        # letting it pile up in memory. The first URL that fails raises its
+        # error (FetchError and subclasses) here and stops the others.
+        queue = asyncio.Queue(buffer)
+        finished = object()
+
+        async def produce(url):
+            offers = self.stream_offers(url, known_ids, max_pages)
+            try:
+                async for offer in offers:
+                    await queue.put((url, offer))
+                await queue.put((url, finished))
             except Exception as e:
-                print(f"Error parsing card: {e}")
-                continue
-                
-        return offers
-
-    except Exception as e:
-        print(f"Error fetching offers: {e}")
-        return []
+                await queue.put((url, e))
+            finally:
+                await offers.aclose()
+
+        producers = [asyncio.create_task(produce(url)) for url in urls]
+        remaining = len(producers)
+        try:
+            while remaining:
+                url, offer = await queue.get()
+                if offer is finished:
+                    remaining -= 1
+                    continue
+                if isinstance(offer, Exception):
+                    raise offer
+                yield url, offer
+        finally:
+            for task in producers:
+                task.cancel()
@@ -0,0 +1,155 @@
+import math
+import mmap
+import os
+import struct
+
+import database
+
+SEEN_INDEX_PATH = "seen_index.bin"
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1_000_000
+REBUILD_BATCH = 10000
+
+_MAGIC = b"JFSEEN02"  # 01 keyed offers by their decoded OLX ad id; such files are rebuilt
+_HEADER = struct.Struct("<8sQIQQ")  # magic, bits, hashes, count, offers rowid watermark
+_MASK64 = (1 << 64) - 1
+
+def offer_key(offer_id):
+    # Integer key for an offer: the same 64-bit fingerprint expired offers
+    # leave behind in offer_fingerprints, so a rebuilt index covers them too
+    return database.fingerprint(offer_id) & _MASK64
+
+def _mix(x):
+    # splitmix64 finalizer
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+class SeenIndex:
+    """Bloom filter over offer keys, stored in a memory-mapped file.
+
+    A miss means the offer was never recorded, so the database doesn't have
+    to be asked. A hit is only "probably seen" and is confirmed in SQLite.
+    Nothing is ever removed: offers expired by run_maintenance stay in the
+    filter and are confirmed through offer_fingerprints, which a rebuild
+    reads as well.
+
+    The header keeps the highest offers rowid already added, so on startup
+    only rows written after the last flush are read back."""
+    def __init__(self, path, file, mm, bits, hashes, count, watermark):
+        self.path = path
+        self.file = file
+        self.mm = mm
+        self.bits = bits
+        self.hashes = hashes
+        self.count = count
+        self.watermark = watermark
+        self.offset = _HEADER.size
+
+    @classmethod
+    def create(cls, path, capacity):
+        bits = max(8, int(-capacity * math.log(FALSE_POSITIVE_RATE) / math.log(2) ** 2))
+        bits = (bits + 7) // 8 * 8
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, bits, hashes, 0, 0))
+            f.truncate(_HEADER.size + bits // 8)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path):
+        file = open(path, "r+b")
+        mm = mmap.mmap(file.fileno(), 0)
+        magic, bits, hashes, count, watermark = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC or len(mm) != _HEADER.size + bits // 8:
+            mm.close()
+            file.close()
+            raise ValueError(f"{path} is not a seen index")
+        return cls(path, file, mm, bits, hashes, count, watermark)
+
+    def _positions(self, key):
+        h1 = _mix(key)
+        h2 = _mix(h1) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def might_contain(self, key):
+        mm = self.mm
+        offset = self.offset
+        for pos in self._positions(key):
+            if not mm[offset + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        mm = self.mm
+        offset = self.offset
+        for pos in self._positions(key):
+            mm[offset + (pos >> 3)] |= 1 << (pos & 7)
+        self.count += 1
+
+    def full(self):
+        return self.count >= self.capacity()
+
+    def capacity(self):
+        return int(self.bits * math.log(2) ** 2 / -math.log(FALSE_POSITIVE_RATE))
+
+    def flush(self, watermark=None):
+        if watermark is not None:
+            self.watermark = watermark
+        _HEADER.pack_into(self.mm, 0, _MAGIC, self.bits, self.hashes, self.count, self.watermark)
+        self.mm.flush()
+
+    def close(self):
+        self.flush()
+        self.mm.close()
+        self.file.close()
+
+async def catch_up(index):
+    # Adds offers written after the index's watermark
+    after = index.watermark
+    while True:
+        rows = await database.get_offer_ids_since(after, REBUILD_BATCH)
+        if not rows:
+            break
+        for rowid, offer_id in rows:
+            index.add(offer_key(offer_id))
+        after = rows[-1][0]
+    index.flush(after)
+
+async def add_expired(index):
+    # Adds the fingerprints of offers expired by run_maintenance
+    after = None
+    while True:
+        fingerprints = await database.get_fingerprints_after(after, REBUILD_BATCH)
+        if not fingerprints:
+            break
+        for value in fingerprints:
+            index.add(value & _MASK64)
+        after = fingerprints[-1]
+
+async def load(path=SEEN_INDEX_PATH):
+    # Opens the index file, or builds a new one from the offers and
+    # offer_fingerprints tables when it is missing, unreadable or over
+    # capacity.
+    index = None
+    if os.path.exists(path):
+        try:
+            index = SeenIndex.open(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Rebuilding seen index: {e}")
+    if index is not None:
+        await catch_up(index)
+        if not index.full():
+            return index
+        index.close()
+
+    total = await database.count_offers() + await database.count_fingerprints()
+    index = SeenIndex.create(path + ".tmp", max(MIN_CAPACITY, total * 2))
+    await add_expired(index)
+    await catch_up(index)
+    index.close()
+    os.replace(path + ".tmp", path)
+    print(f"Built seen index for {total} offers")
+    return SeenIndex.open(path)
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import queue
+
+import scraper
+
+# Number of scraper processes; 0 keeps fetching and parsing in the bot process
+SCRAPER_WORKERS = int(os.getenv("SCRAPER_WORKERS", "0"))
+WATCH_SECONDS = 5  # how often the bot process checks that its scraper processes are alive
+
+def shard_for(url, shards):
+    # Stable across processes and restarts (unlike hash()), so a URL always
+    # lands on the same worker and keeps its conditional-request cache.
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+# --- Worker process side ---
+
+def worker_main(shard, shards, host_interval, jobs, results):
+    try:
+        asyncio.run(_serve(shard, shards, host_interval, jobs, results))
+    except KeyboardInterrupt:
+        pass
+
+async def _serve(shard, shards, host_interval, jobs, results):
+    # The per-host rate limit is shared out between workers, so N workers
+    # together still send no more than one process would.
+    fetcher = scraper.Fetcher(host_interval=host_interval * shards, parse_workers=0)
+    await fetcher.start()
+    loop = asyncio.get_running_loop()
+    running = set()
+    try:
+        while True:
+            job = await loop.run_in_executor(None, jobs.get)
+            if job is None:
+                break
+            task = asyncio.create_task(_check(fetcher, job, results))
+            running.add(task)
+            task.add_done_callback(running.discard)
+    finally:
+        for task in running:
+            task.cancel()
+        await fetcher.close()
+
+async def _check(fetcher, job, results):
+    # Same page stream as the in-process pipeline; every parsed page and the
+    # end of the job are reported back to the bot process.
+    job_id, url, known_ids, max_pages, backfill, validators = job
+    # The bot process holds the persisted page cache; it wins over ours
+    if validators:
+        fetcher.page_cache[url] = validators
+    else:
+        fetcher.page_cache.pop(url, None)
+    try:
+        async for result in fetcher.stream_pages(url, known_ids, max_pages, backfill):
+            if result.status == scraper.NOT_MODIFIED:
+                results.put(("page", job_id, None, 0, result.fetch_seconds, 0.0))
+                continue
+            results.put(("page", job_id, result.offers, result.failures, result.fetch_seconds, result.seconds))
+            if result.status == scraper.PARSE_FAILURE:
+                fetcher.page_cache.pop(url, None)
+                results.put(("error", job_id, result.status, f"no listing found in {url}"))
+    except Exception as e:
+        fetcher.page_cache.pop(url, None)
+        results.put(("error", job_id, getattr(e, "status", scraper.NETWORK_ERROR), str(e)))
+    finally:
+        results.put(("done", job_id, fetcher.page_cache.get(url)))
+
+# --- Bot process side ---
+
+class ShardPool:
+    """Scraper processes, each owning the search URLs that hash to it.
+
+    Jobs go out on one queue per worker; parsed pages come back on a
+    shared results queue and are handed to on_message(message) on the
+    event loop. A worker that dies (crash, OOM kill) is replaced, and the
+    jobs it held are reported as failed and done, so nothing waits on them."""
+    def __init__(self, shards, on_message, host_interval=scraper.HOST_INTERVAL):
+        self.shards = shards
+        self.host_interval = host_interval
+        self.on_message = on_message
+        self.context = multiprocessing.get_context("spawn")
+        self.job_queues = []
+        self.processes = []
+        self.assigned = {}  # job id -> shard, until its "done" is read
+        self.results = None
+        self.reader = None
+        self.watcher = None
+
+    async def start(self):
+        self.results = self.context.Queue()
+        self.job_queues = [None] * self.shards
+        self.processes = [None] * self.shards
+        for shard in range(self.shards):
+            self._spawn(shard)
+        self.reader = asyncio.create_task(self._read())
+        self.watcher = asyncio.create_task(self._watch())
+        print(f"Started {self.shards} scraper workers")
+
+    def _spawn(self, shard):
+        jobs = self.context.Queue()
+        process = self.context.Process(
+            target=worker_main, args=(shard, self.shards, self.host_interval, jobs, self.results),
+            name=f"scraper-{shard}", daemon=True
+        )
+        process.start()
+        self.job_queues[shard] = jobs
+        self.processes[shard] = process
+
+    def submit(self, job_id, url, known_ids, max_pages=scraper.MAX_PAGES, backfill=False, validators=None):
+        shard = shard_for(url, self.shards)
+        self.assigned[job_id] = shard
+        self.job_queues[shard].put((job_id, url, frozenset(known_ids), max_pages, backfill, validators))
+
+    async def _read(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                message = await loop.run_in_executor(None, self.results.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if message is None:
+                break
+            if message[0] == "done":
+                self.assigned.pop(message[1], None)
+            try:
+                await self.on_message(message)
+            except Exception as e:
+                print(f"Error handling worker result: {e}")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(WATCH_SECONDS)
+            for shard, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                lost = [job_id for job_id, owner in self.assigned.items() if owner == shard]
+                print(f"Scraper worker {shard} died (exit code {process.exitcode}), restarting it and failing {len(lost)} jobs")
+                # Jobs still queued for the dead worker are among the lost ones
+                self.job_queues[shard].cancel_join_thread()
+                self._spawn(shard)
+                # Sent through the results queue, so they are read after
+                # whatever the worker managed to report before it died.
+                # The pipeline ignores messages for jobs that already ended.
+                for job_id in lost:
+                    self.results.put(("error", job_id, scraper.NETWORK_ERROR, f"scraper worker {shard} died"))
+                    self.results.put(("done", job_id, None))
+
+    async def close(self):
+        if self.watcher:
+            # Stopped first, or the workers exiting below would be respawned
+            self.watcher.cancel()
+            await asyncio.gather(self.watcher, return_exceptions=True)
+            self.watcher = None
+        for jobs in self.job_queues:
+            jobs.put(None)
+        if self.reader:
+            self.results.put(None)
+            await asyncio.gather(self.reader, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        self.job_queues = []
+        self.processes = []
+        self.assigned = {}